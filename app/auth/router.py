@@ -1,7 +1,6 @@
 import logging
 from fastapi import APIRouter, Request, HTTPException, Depends, Query, status
 from fastapi.responses import RedirectResponse
-from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from app.dao.dao import UserDAO
 from app.twa.validation import TelegramWebAppValidator
@@ -10,6 +9,7 @@ from app.dao.session_maker import async_session_maker
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from app.config import settings
+from app.utils.templating import templates
 from app.giftme.models import User
 from app.auth.schemas import STokenRefreshRequest, STokenRefreshResponse
 from app.auth.utils import create_access_token, create_refresh_token, validate_jwt_token
@@ -17,7 +17,6 @@ from app.dao.dao import UserDAO
 from app.dao.session_maker import connection  
 
 router = APIRouter(prefix="/twa", tags=["twa"])
-templates = Jinja2Templates(directory="app/templates")
 
 telegram_validator = TelegramWebAppValidator(settings.BOT_TOKEN)
 auth_manager = TWAAuthManager(settings.secret_key)
@@ -0,0 +1,68 @@
+"""
+Benchmark of list-sized JSON responses: the default FastAPI path
+(response_model validate + serialize, then JSONResponse's stdlib json)
+against trusted-ORM serializers + orjson.
+
+Run: python -m app.bench_json [items] [rounds]
+"""
+import json
+import sys
+import timeit
+from types import SimpleNamespace
+from typing import List
+
+import orjson
+from fastapi._compat import ModelField
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_model_field
+
+from app.giftme.schemas import GiftResponse, serialize_gift
+
+
+def make_gifts(count: int) -> list:
+    # Stand-ins for ORM Gift rows: plain attribute access, like loaded instances
+    return [
+        SimpleNamespace(
+            id=i,
+            name=f"Gift {i}",
+            description=f"Description of gift number {i}",
+            price=10.0 + i,
+            owner_id=i % 100,
+            created_at=None,
+        )
+        for i in range(count)
+    ]
+
+
+def default_path(gifts: list, field: ModelField) -> bytes:
+    # fastapi.routing.serialize_response for response_model=List[GiftResponse], then JSONResponse.render
+    value, errors = field.validate(gifts, {}, loc=("response",))
+    assert not errors
+    return JSONResponse.render(None, field.serialize(value))
+
+
+def fast_path(gifts: list) -> bytes:
+    # serialize_gift + ORJSONResponse.render
+    return orjson.dumps([serialize_gift(gift) for gift in gifts], option=orjson.OPT_NON_STR_KEYS)
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    gifts = make_gifts(items)
+    # The response field FastAPI builds for the route's response_model
+    field = create_model_field("Response_list_gifts", List[GiftResponse], mode="serialization")
+
+    assert json.loads(default_path(gifts, field)) == json.loads(fast_path(gifts))
+
+    default_time = timeit.timeit(lambda: default_path(gifts, field), number=rounds)
+    fast_time = timeit.timeit(lambda: fast_path(gifts), number=rounds)
+
+    print(f"{items} gifts x {rounds} rounds")
+    print(f"default (validate + serialize + json): {default_time / rounds * 1000:.3f} ms/response")
+    print(f"fast (serializer + orjson):          {fast_time / rounds * 1000:.3f} ms/response")
+    print(f"speedup: {default_time / fast_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
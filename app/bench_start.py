@@ -0,0 +1,206 @@
+"""
+Benchmark of /start handling over a synthetic update stream: the previous
+cmd_start flow (lookup, ORM add with its own commit, refresh token update
+with another commit) against login_telegram_user (cached id, single upsert,
+one commit).
+
+Updates go through a real Dispatcher and cmd_start; the database and the
+Bot API are simulated with a fixed latency per round trip and a
+connection pool of the engine's default size.
+
+Run: python -m app.bench_start [updates] [users] [db_latency_ms] [workers]
+"""
+import asyncio
+import logging
+import sys
+import time
+from unittest.mock import patch
+
+from aiogram import Bot, Dispatcher, methods
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Message, Update
+
+import app.bot.handlers.router as start_module
+from app.config import settings
+from app.dao.dao import UserDAO
+from app.utils.cache import RegisteredUserMap
+
+
+class FakeDB:
+    def __init__(self, latency: float, pool_size: int = 15):
+        self.latency = latency
+        self.pool = asyncio.Semaphore(pool_size)
+        self.users = {}
+        self.round_trips = 0
+        self.commits = 0
+
+    def session(self):
+        return FakeSession(self)
+
+    def get_or_create(self, telegram_id: int) -> int:
+        return self.users.setdefault(telegram_id, len(self.users) + 1)
+
+
+class FakeSession:
+    """Takes a pooled connection on first use and gives it back on commit, like AsyncSession"""
+
+    def __init__(self, db: FakeDB):
+        self.db = db
+        self.connected = False
+
+    async def round_trip(self):
+        if not self.connected:
+            await self.db.pool.acquire()
+            self.connected = True
+        self.db.round_trips += 1
+        await asyncio.sleep(self.db.latency)
+
+    async def commit(self):
+        if self.connected:
+            await self.round_trip()
+            self.db.commits += 1
+            self.db.pool.release()
+            self.connected = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.connected:
+            self.db.pool.release()
+            self.connected = False
+
+
+class FakeBotSession(BaseSession):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    async def make_request(self, bot, method, timeout=None):
+        await asyncio.sleep(self.latency)
+        if isinstance(method, methods.SendMessage):
+            return Message.model_validate(
+                {"message_id": 1, "date": 0, "chat": {"id": method.chat_id, "type": "private"}}
+            )
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def make_updates(count: int, users: int) -> list:
+    updates = []
+    for i in range(count):
+        user_id = 1_000_000 + i % users
+        text = "/start startapp_gifts_11" if i % 4 == 0 else "/start"
+        updates.append(Update.model_validate({
+            "update_id": i,
+            "message": {
+                "message_id": i,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "User", "username": f"user{user_id}"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        }))
+    return updates
+
+
+def legacy_login(db: FakeDB):
+    async def login(from_user):
+        session = db.session()
+        await session.round_trip()  # find_one_or_none
+        user_id = db.users.get(from_user.id)
+        if user_id is None:
+            await session.round_trip()  # flush: INSERT users
+            await session.round_trip()  # flush: INSERT profiles
+            user_id = db.get_or_create(from_user.id)
+            await session.commit()  # UserDAO.add
+        tokens = start_module.mint_tokens(user_id)
+        await session.round_trip()  # UPDATE refresh_token
+        await session.commit()  # update_refresh_token
+        await session.commit()  # @connection(), nothing left to commit
+        return tokens
+    return login
+
+
+def patched_dao(db: FakeDB):
+    async def update_refresh_token(session, user_id, new_refresh_token, commit=True):
+        await session.round_trip()
+        if commit:
+            await session.commit()
+        return user_id in db.users.values()
+
+    async def provision_telegram_user(session, telegram_id, username, first_name, last_name):
+        await session.round_trip()
+        return db.get_or_create(telegram_id)
+
+    return (
+        patch.object(UserDAO, "update_refresh_token", update_refresh_token),
+        patch.object(UserDAO, "provision_telegram_user", provision_telegram_user),
+    )
+
+
+async def run(name: str, updates: list, users: int, latency: float, workers: int):
+    db = FakeDB(latency)
+    # Half of the users already have an account, but no process has them cached yet
+    for i in range(0, users, 2):
+        db.get_or_create(1_000_000 + i)
+
+    dp = Dispatcher()
+    dp.include_router(start_module.router)
+    bot = Bot("123456:ABCdefGhIJKlmnOPQrstUVwxyz", session=FakeBotSession(latency))
+
+    patches = [
+        patch.object(start_module, "async_session_maker", db.session),
+        patch.object(start_module, "registered_users", RegisteredUserMap()),
+    ]
+    if name == "legacy":
+        patches.append(patch.object(start_module, "login_telegram_user", legacy_login(db)))
+    else:
+        patches.extend(patched_dao(db))
+
+    stream = iter(updates)
+
+    async def worker():
+        for update in stream:
+            await dp.feed_update(bot, update)
+
+    for p in patches:
+        p.start()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        elapsed = time.perf_counter() - started
+    finally:
+        for p in reversed(patches):
+            p.stop()
+        dp.sub_routers.remove(start_module.router)
+        start_module.router._parent_router = None
+
+    print(
+        f"{name:>7}: {len(updates) / elapsed:8.0f} updates/s, "
+        f"{db.round_trips / len(updates):.2f} DB round trips/update, "
+        f"{db.commits / len(updates):.2f} commits/update"
+    )
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 2.0) / 1000
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else settings.WEBHOOK_WORKERS
+    updates = make_updates(count, users)
+    logging.disable(logging.INFO)
+
+    print(f"{count} /start updates from {users} users, {latency * 1000:.1f} ms per round trip, {workers} workers")
+    await run("legacy", updates, users, latency, workers)
+    await run("lean", updates, users, latency, workers)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
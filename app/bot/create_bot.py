@@ -1,19 +1,29 @@
+import asyncio
 import logging
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from app.config import settings  # Import settings
+from app.utils.rate_limiter import Priority, RateLimitMiddleware, bot_api_limiter, outbound_priority
 
 bot = Bot(token=settings.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+bot.session.middleware(RateLimitMiddleware(
+    bot_api_limiter,
+    max_retries=settings.TELEGRAM_MAX_RETRIES,
+    max_retry_after=settings.TELEGRAM_MAX_RETRY_AFTER
+))
 dp = Dispatcher()
 
 
 async def start_bot():
     logging.info("Bot started")
     try:
-        for admin_id in settings.ADMIN_IDS:
-            await bot.send_message(admin_id, f'Bot was started.')
+        with outbound_priority(Priority.NOTIFICATION):
+            await asyncio.gather(
+                *(bot.send_message(admin_id, f'Bot was started.') for admin_id in settings.ADMIN_IDS),
+                return_exceptions=True
+            )
     except:
         pass
 
@@ -21,7 +31,10 @@ async def start_bot():
 async def stop_bot():
     logging.info("Bot stopped")
     try:
-        for admin_id in settings.ADMIN_IDS:
-            await bot.send_message(admin_id, 'Bot was stopped.')
+        with outbound_priority(Priority.NOTIFICATION):
+            await asyncio.gather(
+                *(bot.send_message(admin_id, 'Bot was stopped.') for admin_id in settings.ADMIN_IDS),
+                return_exceptions=True
+            )
     except:
         pass
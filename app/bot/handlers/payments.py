@@ -4,22 +4,25 @@ from app.dao.dao import GiftDAO, PaymentDAO, UserDAO
 from app.dao.session_maker import async_session_maker, connection
 from app.config import settings
 from app.giftme.schemas import PaymentCreate, UserFilterPydantic  
+from app.service.InvoiceService import invoice_gift_id
+from app.service.PaymentService import pre_checkout_validator
 import logging
 
 router = Router()
 
 @router.pre_checkout_query()
 async def process_pre_checkout_query(pre_checkout_query: types.PreCheckoutQuery):
-    """Simple pre-checkout validation for Stars payments"""
+    """Validate a Stars payment against its invoice and gift before it is charged"""
     try:
-        gift_id = int(pre_checkout_query.invoice_payload)
-        await pre_checkout_query.answer(ok=True)
+        error = await pre_checkout_validator.validate(pre_checkout_query)
     except Exception as e:
         logging.error(f"Pre-checkout error: {e}")
-        await pre_checkout_query.answer(
-            ok=False,
-            error_message="Payment validation failed"
-        )
+        error = "Payment validation failed"
+
+    if error:
+        await pre_checkout_query.answer(ok=False, error_message=error)
+    else:
+        await pre_checkout_query.answer(ok=True)
 
 @router.message(F.successful_payment)
 @connection()
@@ -31,7 +34,7 @@ async def process_successful_payment(message: types.Message, session, **kwargs):
             logging.error("No successful_payment data in message")
             return
         payment_info = message.successful_payment
-        gift_id = int(payment_info.invoice_payload)
+        gift_id = invoice_gift_id(payment_info.invoice_payload)
         stars_amount = payment_info.total_amount 
         
         # async with async_session_maker() as session:
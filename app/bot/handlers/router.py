@@ -1,14 +1,15 @@
 import logging  
+from typing import Tuple
 from aiogram import Router, F
 from aiogram.filters import CommandStart
-from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo, User as TelegramUser
 from app.dao.dao import UserDAO
 from app.bot.keyboards.kbs import main_keyboard
-from app.dao.session_maker import connection 
-from app.giftme.schemas import UserPydantic, ProfilePydantic, UserFilterPydantic, UserCreate
+from app.dao.session_maker import async_session_maker
 from app.twa.auth import TWAAuthManager  
 from app.config import settings  
 from app.utils.bot_instance import telegram_bot
+from app.utils.cache import registered_users
 from app.bot.handlers.payments import router as payments_router
 
 auth_manager = TWAAuthManager(settings.secret_key)
@@ -16,9 +17,43 @@ auth_manager = TWAAuthManager(settings.secret_key)
 router = Router()
 router.include_router(payments_router)
 
+
+def mint_tokens(user_id: int) -> Tuple[str, str]:
+    return auth_manager.create_access_token(user_id), auth_manager.create_refresh_token(user_id)
+
+
+async def login_telegram_user(from_user: TelegramUser) -> Tuple[str, str]:
+    """
+    Provision the user behind a /start and issue its (access, refresh) tokens.
+
+    One transaction, one commit. A known user's tokens are minted before the
+    session is opened, so only the refresh token UPDATE runs on the
+    connection; otherwise the user is fetched or created with a single
+    upsert first.
+    """
+    found, _ = registered_users.lookup([from_user.id])
+    user_id = found.get(from_user.id)
+    tokens = mint_tokens(user_id) if user_id else None
+
+    async with async_session_maker() as session:
+        if tokens is None or not await UserDAO.update_refresh_token(session, user_id, tokens[1], commit=False):
+            user_id = await UserDAO.provision_telegram_user(
+                session,
+                telegram_id=from_user.id,
+                username=from_user.username,
+                first_name=from_user.first_name,
+                last_name=from_user.last_name
+            )
+            tokens = mint_tokens(user_id)
+            await UserDAO.update_refresh_token(session, user_id, tokens[1], commit=False)
+        await session.commit()
+
+    registered_users.remember(from_user.id, user_id)
+    return tokens
+
+
 @router.message(CommandStart())
-@connection()
-async def cmd_start(message: Message, session, **kwargs):  
+async def cmd_start(message: Message, **kwargs):  
     try:
         user_id = message.from_user.id
         logging.info(f"Received user_id: {user_id}")
@@ -55,28 +90,7 @@ async def cmd_start(message: Message, session, **kwargs):
                     webapp_url = f"{settings.BASE_SITE}{return_url}"
 
         # User auth logic
-        filter_model = UserFilterPydantic(telegram_id=user_id)
-        user_info = await UserDAO.find_one_or_none(session=session, filters=filter_model)
-
-        if not user_info:
-            # Create new user
-            profile = ProfilePydantic(
-                first_name=message.from_user.first_name,
-                last_name=message.from_user.last_name
-            )
-            values = UserCreate(
-                telegram_id=user_id,
-                username=message.from_user.username,
-                profile=profile
-            )
-            user = await UserDAO.add(session=session, values=values)
-            access_token = auth_manager.create_access_token(user.id)
-            refresh_token = auth_manager.create_refresh_token(user.id)
-            await UserDAO.update_refresh_token(session, user.id, refresh_token)
-        else:
-            access_token = auth_manager.create_access_token(user_info.id)
-            refresh_token = auth_manager.create_refresh_token(user_info.id)
-            await UserDAO.update_refresh_token(session, user_info.id, refresh_token)
+        access_token, refresh_token = await login_telegram_user(message.from_user)
 
         # Build webapp URL with auth params
         auth_params = f"startParam={access_token}&refresh_token={refresh_token}"
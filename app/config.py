@@ -1,5 +1,6 @@
+import hashlib
 import os
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -18,7 +19,52 @@ class Settings(BaseSettings):
     TELEGRAM_API_ID: int
     TELEGRAM_API_HASH: str
     TELEGRAM_PHONE: str
+    TELEGRAM_SESSION: Optional[str] = None  # StringSession, see app/utils/telegram_client.py
+    TELEGRAM_CONNECTION_RETRIES: int = 5
+    TELEGRAM_RETRY_DELAY: int = 1
+    TELEGRAM_GLOBAL_RATE: float = 30  # Bot API calls per second
+    TELEGRAM_GLOBAL_BURST: float = 30
+    TELEGRAM_CHAT_RATE: float = 1  # Calls per second to one chat
+    TELEGRAM_CHAT_BURST: float = 3
+    TELEGRAM_MAX_RETRIES: int = 3
+    TELEGRAM_MAX_RETRY_AFTER: int = 30  # Longer flood waits fail instead of waiting
+    BROADCAST_RATE: float = 25  # Messages per second, below TELEGRAM_GLOBAL_RATE
+    BROADCAST_CONCURRENCY: int = 20
+    BROADCAST_WINDOW: int = 5000  # Recipients per server-side cursor
+    # One ImportContactsRequest per chunk: a 5000-contact import takes ~50 s at these defaults
+    MTPROTO_RATE: float = 1
+    MTPROTO_BURST: float = 4
+    CONTACT_IMPORT_CHUNK_SIZE: int = 100
+    CONTACT_IMPORT_CONCURRENCY: int = 4
+    WEBHOOK_SECRET: Optional[str] = None  # Derived from BOT_TOKEN when not set
+    WEBHOOK_MAX_BODY_SIZE: int = 256 * 1024
+    WEBHOOK_WORKERS: int = 8
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_ENQUEUE_TIMEOUT: float = 1.0  # Backpressure wait before answering 503
+    WEBHOOK_DRAIN_TIMEOUT: float = 10.0
+    UPDATE_DEDUP_WINDOW: int = 10_000
+    UPDATE_DEDUP_DB: bool = False  # Share seen update_ids between processes via processed_updates
+    UPDATE_DEDUP_RETENTION_HOURS: int = 24
+    JOB_WORKER_CONCURRENCY: int = 2
+    JOB_POLL_INTERVAL: float = 2.0
+    JOB_LOCK_TIMEOUT: int = 300  # Running jobs without a heartbeat this long are reclaimed
+    JOB_MAX_ATTEMPTS: int = 3
     IS_DEV: bool 
+    BOT_USERNAME: Optional[str] = None  # Fallback if getMe fails at startup
+    BOT_INFO_REFRESH_SECONDS: int = 3600
+    GIFT_PAGE_CACHE_TTL: int = 60
+    FRAGMENT_CACHE_TTL: int = 30
+    REGISTERED_USER_CACHE_SIZE: int = 100_000
+    REGISTERED_USER_CACHE_TTL: int = 600
+    INVOICE_LINK_TTL: int = 3600  # Reuse of a createInvoiceLink link per (gift, amount)
+    INVOICE_CACHE_SIZE: int = 10_000
+    GIFT_STATUS_CACHE_TTL: int = 30
+    PRE_CHECKOUT_TIMEOUT: float = 5.0  # Telegram waits 10s for the answer
+    LEDGER_ROLLUP_INTERVAL: float = 5.0
+    LEDGER_ROLLUP_BATCH_SIZE: int = 1000
+    TEMPLATE_CACHE_DIR: str = "data/jinja_cache"
+    COMPRESSION_MIN_SIZE: int = 1024
+    METRICS_TOKEN: Optional[str] = None  # Bearer token for /metrics; unset keeps it disabled
 
     # DATABASE_SQLITE = 'sqlite+aiosqlite:///data/db.sqlite3'
     model_config = SettingsConfigDict(
@@ -35,6 +81,13 @@ class Settings(BaseSettings):
         if not base_url.startswith('https://'):
             base_url = f"https://{base_url}"
         return f"{base_url}/webhook"
+
+    def get_webhook_secret(self) -> str:
+        """Секрет для X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)."""
+        if self.WEBHOOK_SECRET:
+            return self.WEBHOOK_SECRET
+        # Одинаковый во всех процессах, но не раскрывает сам токен
+        return hashlib.sha256(f"webhook:{self.BOT_TOKEN}".encode()).hexdigest()
         
 settings = Settings()
 database_url = settings.get_db_url()
@@ -1,12 +1,32 @@
 import logging
-from typing import Optional, List
-from sqlalchemy import select, func, update as sa_update, and_, BigInteger
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional, List, Tuple
+from sqlalchemy import ARRAY, Date, String, Table, cast, select, func, update as sa_update, delete, and_, or_, any_, case, literal, literal_column, true, BigInteger
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from app.dao.base import BaseDAO
-from app.giftme.models import Contact, Gift, GiftList, Payment, User, Profile, UserList
+from app.giftme.models import Contact, ContactSyncEntry, ContactSyncState, Gift, GiftList, Invoice, Job, JobStatusEnum, Payment, User, Profile, UserList, gift_list_gift, payment_ledger, payment_rollup_state, payment_totals_by_day, payment_totals_by_gift, payment_totals_by_user, processed_updates
 from app.giftme.schemas import PaymentCreate, UserCreate, UserFilterPydantic, UserPydantic
+from app.utils.cache import fragment_cache, gift_page_cache, gift_statuses, invoice_links, registered_users
+
+# pg_trgm only produces useful similarity scores from three characters on
+TRGM_MIN_QUERY_LENGTH = 3
+
+
+LIKE_ESCAPE = "!"
+CONTACT_UPSERT_BATCH_SIZE = 1000
+USER_RESOLVE_BATCH_SIZE = 5000
+
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input is matched literally"""
+    return (
+        value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2)
+        .replace("%", LIKE_ESCAPE + "%")
+        .replace("_", LIKE_ESCAPE + "_")
+    )
 
 
 class UserDAO(BaseDAO[User]):
@@ -60,6 +80,7 @@ class UserDAO(BaseDAO[User]):
 
         # Один коммит для обеих операций
         await session.commit()
+        registered_users.remember(user.telegram_id, user.id)
 
         return user  # Возвращаем объект пользователя
 
@@ -95,6 +116,7 @@ class UserDAO(BaseDAO[User]):
         session.add(user)
         await session.flush()
         await session.commit()
+        registered_users.remember(user.telegram_id, user.id)
         return UserPydantic.from_orm(user)  # Return Pydantic model
 
     async def create_user(self, user_data: dict) -> User:
@@ -106,6 +128,7 @@ class UserDAO(BaseDAO[User]):
         )
         self.session.add(user)
         await self.session.commit()
+        registered_users.remember(user.telegram_id, user.id)
         return user
 
     async def get_user_by_username(self, username: str) -> Optional[User]:
@@ -133,13 +156,59 @@ class UserDAO(BaseDAO[User]):
         return result.scalars().first()
     
     @staticmethod
-    async def update_refresh_token(session: AsyncSession, user_id: int, new_refresh_token: str) -> None:
-        await session.execute(
+    async def update_refresh_token(session: AsyncSession, user_id: int, new_refresh_token: str, commit: bool = True) -> bool:
+        """Store a user's refresh token; False if the user does not exist"""
+        result = await session.execute(
             sa_update(User)
             .where(User.id == user_id)
             .values(refresh_token=new_refresh_token)
         )
-        await session.commit()
+        if commit:
+            await session.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def provision_telegram_user(
+        session: AsyncSession,
+        telegram_id: int,
+        username: Optional[str],
+        first_name: Optional[str],
+        last_name: Optional[str]
+    ) -> int:
+        """
+        Get or create the user (and profile) of a Telegram account in a single
+        statement and return its id. Does not commit.
+        """
+        inserted = (
+            pg_insert(User)
+            .values(telegram_id=telegram_id, username=username)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.id)
+            .cte("inserted_user")
+        )
+        profile = (
+            pg_insert(Profile)
+            .from_select(
+                ["user_id", "first_name", "last_name"],
+                select(inserted.c.id, literal(first_name, String), literal(last_name, String))
+            )
+            .cte("inserted_profile")
+        )
+        # The existing row is invisible to the insert's snapshot and vice versa,
+        # so exactly one side yields the id
+        stmt = select(
+            func.coalesce(
+                select(inserted.c.id).scalar_subquery(),
+                select(User.id).where(User.telegram_id == telegram_id).scalar_subquery()
+            )
+        ).add_cte(profile)
+        # A concurrent first /start of the same account can commit between the
+        # two; the retry then sees its row
+        for _ in range(2):
+            user_id = (await session.execute(stmt)).scalar()
+            if user_id is not None:
+                return user_id
+        raise SQLAlchemyError(f"Could not provision user for telegram_id {telegram_id}")
 
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         return await self.session.get(User, user_id)
@@ -150,10 +219,302 @@ class UserDAO(BaseDAO[User]):
         result = await self.session.execute(query)
         return result.scalars().all()
 
+    async def resolve_registered(self, telegram_ids: List[int]) -> dict:
+        """
+        Map Telegram ids to registered user ids (unregistered ids are left out).
+
+        Served from the registered_users map where possible; the rest is
+        queried in telegram_id = ANY(:ids) batches.
+        """
+        found, missing = registered_users.lookup(telegram_ids)
+        try:
+            for i in range(0, len(missing), USER_RESOLVE_BATCH_SIZE):
+                chunk = missing[i:i + USER_RESOLVE_BATCH_SIZE]
+                result = await self.session.execute(
+                    select(self.model.telegram_id, self.model.id)
+                    .where(self.model.telegram_id == any_(literal(chunk, ARRAY(BigInteger))))
+                )
+                resolved = dict(result.all())
+                registered_users.store(resolved, chunk)
+                found.update(resolved)
+            return found
+        except SQLAlchemyError as e:
+            logging.error(f"Error resolving registered users: {e}")
+            raise
+
+    async def count_users_after(self, after_id: int) -> int:
+        result = await self.session.execute(
+            select(func.count()).select_from(self.model).where(self.model.id > after_id)
+        )
+        return result.scalar_one()
+
+    async def stream_recipients(
+        self, after_id: int, limit: int, yield_per: int = 500
+    ) -> AsyncIterator[List[Tuple[int, int]]]:
+        """
+        (user id, telegram id) pairs after after_id in id order, read through a
+        server-side cursor in partitions of yield_per rows.
+        """
+        result = await self.session.stream(
+            select(self.model.id, self.model.telegram_id)
+            .where(self.model.id > after_id)
+            .order_by(self.model.id)
+            .limit(limit)
+            .execution_options(yield_per=yield_per)
+        )
+        async for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+    async def search_users(self, user_id: int, query: str = "", limit: int = 20) -> List[dict]:
+        """
+        Autocomplete over username and profile names.
+
+        Prefix matches and pg_trgm similarity are served by the trigram GIN
+        indexes; the caller's own contacts are ranked first.
+        """
+        try:
+            query = (query or "").strip()
+            is_contact = Contact.id.isnot(None)
+            stmt = (
+                select(
+                    self.model.id,
+                    self.model.username,
+                    Profile.first_name,
+                    Profile.last_name,
+                    is_contact.label("is_contact"),
+                )
+                .outerjoin(Profile, Profile.user_id == self.model.id)
+                .outerjoin(
+                    Contact,
+                    and_(
+                        Contact.user_id == user_id,
+                        Contact.contact_telegram_id == self.model.telegram_id
+                    )
+                )
+                .where(self.model.id != user_id)
+            )
+
+            if query:
+                pattern = escape_like(query) + "%"
+                prefix_match = or_(
+                    self.model.username.ilike(pattern, escape=LIKE_ESCAPE),
+                    Profile.first_name.ilike(pattern, escape=LIKE_ESCAPE),
+                    Profile.last_name.ilike(pattern, escape=LIKE_ESCAPE),
+                )
+                conditions = [prefix_match]
+                if len(query) >= TRGM_MIN_QUERY_LENGTH:
+                    conditions += [
+                        self.model.username.op("%")(query),
+                        Profile.first_name.op("%")(query),
+                        Profile.last_name.op("%")(query),
+                    ]
+                similarity = func.greatest(
+                    func.similarity(self.model.username, query),
+                    func.similarity(func.coalesce(Profile.first_name, ""), query),
+                    func.similarity(func.coalesce(Profile.last_name, ""), query),
+                )
+                stmt = stmt.where(or_(*conditions)).order_by(
+                    is_contact.desc(),
+                    case((prefix_match, 0), else_=1),
+                    similarity.desc(),
+                    self.model.username,
+                )
+            else:
+                stmt = stmt.order_by(is_contact.desc(), self.model.username)
+
+            result = await self.session.execute(stmt.limit(limit))
+            return [
+                {
+                    "id": row.id,
+                    "username": row.username,
+                    "first_name": row.first_name,
+                    "last_name": row.last_name,
+                    "is_contact": row.is_contact,
+                }
+                for row in result.all()
+            ]
+        except SQLAlchemyError as e:
+            logging.error(f"Error searching users: {e}")
+            raise
+
 class ProfileDAO(BaseDAO[Profile]):
     model = Profile
 
 
+class LedgerDAO:
+    """
+    Append-only payment ledger and its per-gift, per-user and per-day rollups.
+
+    Appends serialize on an advisory lock, so sequence numbers become
+    visible in increasing order and a rollup that resumes after its last
+    seq never skips an entry. Readers add the entries past that seq (the
+    tail, at most one rollup interval of payments) to the rolled-up
+    totals, so they see a payment as soon as it commits.
+    """
+    ROLLUP = "payments"
+    APPEND_LOCK = 0x6c6564676572  # pg_advisory_xact_lock key
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def append(self, payment: Payment, commit: bool = True) -> int:
+        """Record a flushed payment; returns its sequence number"""
+        try:
+            await self.session.execute(select(func.pg_advisory_xact_lock(self.APPEND_LOCK)))
+            result = await self.session.execute(
+                pg_insert(payment_ledger)
+                .values(
+                    payment_id=payment.id,
+                    user_id=payment.user_id,
+                    gift_id=payment.gift_id,
+                    amount=payment.amount
+                )
+                .returning(payment_ledger.c.seq)
+            )
+            seq = result.scalar_one()
+            if commit:
+                await self.session.commit()
+            return seq
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error appending payment {payment.id} to the ledger: {e}")
+            raise
+
+    @classmethod
+    def _last_seq(cls):
+        return func.coalesce(
+            select(payment_rollup_state.c.last_seq)
+            .where(payment_rollup_state.c.name == cls.ROLLUP)
+            .scalar_subquery(),
+            0
+        )
+
+    @classmethod
+    def totals(cls, rollup: Table, key: str, keys=None):
+        """
+        Subquery of (key, total, payments, last_payment_at): the rollup plus
+        the ledger tail, optionally limited to the given keys.
+        """
+        rolled = select(
+            rollup.c[key].label("key"), rollup.c.total, rollup.c.payments, rollup.c.last_payment_at
+        )
+        tail = select(
+            payment_ledger.c[key].label("key"),
+            payment_ledger.c.amount.label("total"),
+            literal_column("1").label("payments"),
+            payment_ledger.c.created_at.label("last_payment_at")
+        ).where(payment_ledger.c.seq > cls._last_seq())
+        if keys is not None:
+            rolled = rolled.where(rollup.c[key].in_(keys))
+            tail = tail.where(payment_ledger.c[key].in_(keys))
+        combined = rolled.union_all(tail).subquery()
+        return (
+            select(
+                combined.c.key.label(key),
+                func.sum(combined.c.total).label("total"),
+                func.sum(combined.c.payments).label("payments"),
+                func.max(combined.c.last_payment_at).label("last_payment_at")
+            )
+            .group_by(combined.c.key)
+            .subquery()
+        )
+
+    async def user_totals(self, user_id: int) -> dict:
+        """What a user has paid in total"""
+        totals = self.totals(payment_totals_by_user, "user_id", [user_id])
+        result = await self.session.execute(select(totals.c.total, totals.c.payments, totals.c.last_payment_at))
+        row = result.first()
+        if not row:
+            return {"total": 0, "payments": 0, "last_payment_at": None}
+        return {"total": row.total, "payments": row.payments, "last_payment_at": row.last_payment_at}
+
+    async def daily_totals(self, days: int) -> List[dict]:
+        """Rolled-up totals of the last `days` days (UTC), newest first"""
+        since = datetime.now(timezone.utc).date() - timedelta(days=days)
+        result = await self.session.execute(
+            select(payment_totals_by_day)
+            .where(payment_totals_by_day.c.day > since)
+            .order_by(payment_totals_by_day.c.day.desc())
+        )
+        return [dict(row._mapping) for row in result]
+
+    async def roll_up(self, batch_size: int = 1000) -> int:
+        """
+        Fold the next batch of ledger entries into the rollups and advance
+        the rollup seq, in one transaction. Returns the number of entries
+        folded; 0 when there is nothing new or another worker is rolling up.
+        """
+        try:
+            await self.session.execute(
+                pg_insert(payment_rollup_state).values(name=self.ROLLUP).on_conflict_do_nothing()
+            )
+            result = await self.session.execute(
+                select(payment_rollup_state.c.last_seq)
+                .where(payment_rollup_state.c.name == self.ROLLUP)
+                .with_for_update(skip_locked=True)
+            )
+            last_seq = result.scalar_one_or_none()
+            if last_seq is None:
+                await self.session.rollback()
+                return 0
+
+            batch = (
+                select(payment_ledger.c.seq)
+                .where(payment_ledger.c.seq > last_seq)
+                .order_by(payment_ledger.c.seq)
+                .limit(batch_size)
+                .subquery()
+            )
+            result = await self.session.execute(select(func.max(batch.c.seq), func.count()).select_from(batch))
+            upto, count = result.one()
+            if not count:
+                await self.session.rollback()
+                return 0
+
+            entries = (
+                select(
+                    payment_ledger,
+                    cast(func.timezone("UTC", payment_ledger.c.created_at), Date).label("day")
+                )
+                .where(payment_ledger.c.seq > last_seq, payment_ledger.c.seq <= upto)
+                .cte("entries")
+            )
+            for rollup, key in (
+                (payment_totals_by_gift, "gift_id"),
+                (payment_totals_by_user, "user_id"),
+                (payment_totals_by_day, "day"),
+            ):
+                stmt = pg_insert(rollup).from_select(
+                    [key, "total", "payments", "last_payment_at"],
+                    select(
+                        entries.c[key],
+                        func.sum(entries.c.amount),
+                        func.count(),
+                        func.max(entries.c.created_at)
+                    ).group_by(entries.c[key])
+                )
+                await self.session.execute(stmt.on_conflict_do_update(
+                    index_elements=[key],
+                    set_={
+                        "total": rollup.c.total + stmt.excluded.total,
+                        "payments": rollup.c.payments + stmt.excluded.payments,
+                        "last_payment_at": func.greatest(rollup.c.last_payment_at, stmt.excluded.last_payment_at),
+                    }
+                ))
+
+            await self.session.execute(
+                sa_update(payment_rollup_state)
+                .where(payment_rollup_state.c.name == self.ROLLUP)
+                .values(last_seq=upto, updated_at=func.now())
+            )
+            await self.session.commit()
+            return count
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error rolling up the payment ledger: {e}")
+            raise
+
+
 class PaymentDAO(BaseDAO[Payment]):
     model = Payment
 
@@ -165,35 +526,100 @@ class PaymentDAO(BaseDAO[Payment]):
             telegram_payment_charge_id=payment.telegram_payment_charge_id
         )
         self.session.add(new_payment)
+        await self.session.flush()
+        # Ledger entry in the same transaction as the payment
+        await LedgerDAO(self.session).append(new_payment, commit=False)
+        owner_id = await self.session.scalar(select(Gift.owner_id).where(Gift.id == payment.gift_id))
         await self.session.commit()
+        gift_page_cache.invalidate(payment.gift_id)
+        gift_statuses.record_payment(payment.gift_id, payment.amount)
+        # The owner's gifts grid shows the paid total
+        fragment_cache.bump(owner_id)
         return new_payment
 
 
 class GiftDAO(BaseDAO[Gift]):
     model = Gift
 
-    async def create_gift(self, gift_data: dict) -> Gift:
+    async def create_gift(self, gift_data: dict, commit: bool = True) -> Gift:
+        """With commit=False the caller bumps the owner's fragment_cache after its commit"""
         gift = self.model(**gift_data)
         self.session.add(gift)
+        if not commit:
+            await self.session.flush()
+            return gift
         await self.session.commit()
+        fragment_cache.bump(gift.owner_id)
+        gift_statuses.set(gift.id, gift.price, 0)
         return gift
 
+    @classmethod
+    async def find_one_or_none_by_id(cls, data_id: int, session: AsyncSession):
+        """Gift as a dict, with its paid total from the ledger rollups"""
+        try:
+            paid = LedgerDAO.totals(payment_totals_by_gift, "gift_id", [data_id])
+            result = await session.execute(
+                select(cls.model, func.coalesce(paid.c.total, 0))
+                .outerjoin(paid, paid.c.gift_id == cls.model.id)
+                .where(cls.model.id == data_id)
+            )
+            row = result.first()
+            return row[0].to_dict(row[1]) if row else None
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting gift {data_id}: {e}")
+            raise
+
     async def get_gift_by_name(self, name: str) -> Optional[Gift]:
         stmt = select(self.model).where(self.model.name == name)
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def update_gift(self, gift_id: int, gift_data: dict) -> Optional[Gift]:
+        """Update the given gift fields, ignoring unset (None) values"""
+        gift = await self.session.get(self.model, gift_id)
+        if not gift:
+            return None
+        for key, value in gift_data.items():
+            if value is not None:
+                setattr(gift, key, value)
+        await self.session.commit()
+        gift_page_cache.invalidate(gift_id)
+        invoice_links.invalidate(gift_id)
+        gift_statuses.update_price(gift_id, gift.price)
+        fragment_cache.bump(gift.owner_id)
+        return gift
+
     async def delete_gift(self, gift_id: int):
         gift = await self.session.get(self.model, gift_id)
         if gift:
             await self.session.delete(gift)
             await self.session.commit()
+            gift_page_cache.invalidate(gift_id)
+            invoice_links.invalidate(gift_id)
+            gift_statuses.set_deleted(gift_id)
+            fragment_cache.bump(gift.owner_id)
+        return gift is not None
 
     async def get_gifts_by_user_id(self, user_id: int) -> List[Gift]:
         stmt = select(self.model).where(self.model.owner_id == user_id)
         result = await self.session.execute(stmt)
         return result.scalars().all()  # Return a list of gifts       
 
+    async def get_gifts_with_paid_by_user_id(self, user_id: int) -> List[Tuple[Gift, float]]:
+        """A user's gifts with their paid totals from the ledger rollups"""
+        paid = LedgerDAO.totals(
+            payment_totals_by_gift,
+            "gift_id",
+            select(self.model.id).where(self.model.owner_id == user_id).scalar_subquery()
+        )
+        stmt = (
+            select(self.model, func.coalesce(paid.c.total, 0))
+            .outerjoin(paid, paid.c.gift_id == self.model.id)
+            .where(self.model.owner_id == user_id)
+        )
+        result = await self.session.execute(stmt)
+        return [(gift, paid_amount) for gift, paid_amount in result.all()]
+
     async def get_gift_with_lists(self, gift_id: int, session: AsyncSession):
         """Get a gift with its associated lists"""
         try:
@@ -218,11 +644,98 @@ class GiftDAO(BaseDAO[Gift]):
             logging.error(f"Error retrieving gift by ID: {e}")
             return None
 
+    async def get_funding(self, gift_id: int) -> Optional[Tuple[float, float]]:
+        """(price, paid total) of a gift in one query, None if it does not exist"""
+        try:
+            paid = LedgerDAO.totals(payment_totals_by_gift, "gift_id", [gift_id])
+            result = await self.session.execute(
+                select(self.model.price, func.coalesce(paid.c.total, 0))
+                .outerjoin(paid, paid.c.gift_id == self.model.id)
+                .where(self.model.id == gift_id)
+            )
+            row = result.first()
+            return tuple(row) if row else None
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting gift funding: {e}")
+            raise
+
+    async def get_gift_page_data(self, gift_id: int):
+        """
+        Get a gift with its paid total and last-modified stamp in one query.
+
+        Returns (gift, paid_amount, last_modified) or None.
+        """
+        try:
+            paid = LedgerDAO.totals(payment_totals_by_gift, "gift_id", [gift_id])
+            stmt = (
+                select(
+                    self.model,
+                    func.coalesce(paid.c.total, 0).label("paid_amount"),
+                    # Naive UTC, like the gift's own timestamps
+                    func.timezone("UTC", paid.c.last_payment_at).label("last_payment_at"),
+                )
+                .outerjoin(paid, paid.c.gift_id == self.model.id)
+                .where(self.model.id == gift_id)
+            )
+            result = await self.session.execute(stmt)
+            row = result.first()
+            if not row:
+                return None
+            gift, paid_amount, last_payment_at = row
+            gift_statuses.set(gift.id, gift.price, paid_amount)
+            last_modified = max(filter(None, [gift.updated_at, gift.created_at, last_payment_at]))
+            return gift, paid_amount, last_modified
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting gift page data: {e}")
+            raise
+
     async def mark_gift_as_paid(self, gift_id: int):
         gift = await self.get_gift_by_id(gift_id)
         gift.is_paid = True
         self.session.add(gift)
         await self.session.commit()
+        gift_page_cache.invalidate(gift_id)
+        fragment_cache.bump(gift.owner_id)
+
+class InvoiceDAO(BaseDAO[Invoice]):
+    model = Invoice
+
+    async def add_invoice(
+        self, gift_id: int, amount: int, payload: str, link: str, expires_at: datetime, commit: bool = True
+    ) -> Invoice:
+        try:
+            invoice = self.model(gift_id=gift_id, amount=amount, payload=payload, link=link, expires_at=expires_at)
+            self.session.add(invoice)
+            if commit:
+                await self.session.commit()
+            else:
+                await self.session.flush()
+            return invoice
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error saving invoice for gift {gift_id}: {e}")
+            raise
+
+    async def find_active(self, gift_id: int, amount: int) -> Optional[Invoice]:
+        """Newest unexpired link for the gift and amount, issued after the gift's last edit"""
+        result = await self.session.execute(
+            select(self.model)
+            .join(Gift, Gift.id == self.model.gift_id)
+            .where(
+                self.model.gift_id == gift_id,
+                self.model.amount == amount,
+                self.model.expires_at > func.now(),
+                self.model.created_at >= Gift.updated_at
+            )
+            .order_by(self.model.id.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def get_by_payload(self, payload: str) -> Optional[Invoice]:
+        result = await self.session.execute(select(self.model).where(self.model.payload == payload))
+        return result.scalars().first()
+
 
 class GiftListDAO(BaseDAO[GiftList]):
     model = GiftList
@@ -231,6 +744,7 @@ class GiftListDAO(BaseDAO[GiftList]):
         gift_list = self.model(**gift_list_data)
         self.session.add(gift_list)
         await self.session.commit()
+        fragment_cache.bump(gift_list.owner_id)
         return gift_list
 
     async def delete_gift_list(self, gift_list_id: int):
@@ -238,41 +752,90 @@ class GiftListDAO(BaseDAO[GiftList]):
         if gift_list:
             await self.session.delete(gift_list)
             await self.session.commit()
+            fragment_cache.bump(gift_list.owner_id)
+        return gift_list is not None
 
-    async def add_gift_to_list(self, list_id: int, gift_id: int) -> bool:
-        """Add a gift to a gift list"""
-        try:
-            gift_list = await self.session.get(self.model, list_id)
-            gift = await self.session.get(Gift, gift_id)
-            
-            if not gift_list or not gift:
-                return False
-                
-            if gift not in gift_list.gifts:
-                gift_list.gifts.append(gift)
+    async def add_gifts_to_lists(self, list_ids: List[int], gift_ids: List[int], owner_id: int, commit: bool = True) -> int:
+        """
+        Add every gift to every list in a single INSERT ... SELECT.
+
+        Only lists and gifts owned by owner_id are linked, existing links are
+        skipped (ON CONFLICT DO NOTHING). Returns the number of new links.
+        With commit=False the caller bumps the owner's fragment_cache after
+        its commit, so no request caches the uncommitted state.
+        """
+        if not list_ids or not gift_ids:
+            return 0
+        try:
+            # Explicit cross join of the owner's lists and gifts
+            pairs = (
+                select(self.model.id, Gift.id)
+                .join(Gift, true())
+                .where(
+                    self.model.id.in_(list_ids),
+                    self.model.owner_id == owner_id,
+                    Gift.id.in_(gift_ids),
+                    Gift.owner_id == owner_id
+                )
+            )
+            stmt = (
+                pg_insert(gift_list_gift)
+                .from_select(["giftlist_id", "gift_id"], pairs)
+                .on_conflict_do_nothing()
+            )
+            result = await self.session.execute(stmt)
+            if commit:
                 await self.session.commit()
-            return True
-        except Exception as e:
-            logging.error(f"Error adding gift to list: {e}")
-            await self.session.rollback()
-            return False
+                fragment_cache.bump(owner_id)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            logging.error(f"Error adding gifts to lists: {e}")
+            if commit:
+                await self.session.rollback()
+            raise
 
-    async def remove_gift_from_list(self, list_id: int, gift_id: int) -> bool:
-        """Remove a gift from a gift list"""
-        try:
-            gift_list = await self.session.get(self.model, list_id)
-            gift = await self.session.get(Gift, gift_id)
-            
-            if not gift_list or not gift:
-                return False
-                
-            if gift in gift_list.gifts:
-                gift_list.gifts.remove(gift)
+    async def remove_gifts_from_lists(self, list_ids: List[int], gift_ids: List[int], owner_id: int, commit: bool = True) -> int:
+        """
+        Remove every gift from every list owned by owner_id in a single DELETE.
+        With commit=False the caller bumps the owner's fragment_cache after its commit.
+        """
+        if not list_ids or not gift_ids:
+            return 0
+        try:
+            owned_lists = select(self.model.id).where(
+                self.model.id.in_(list_ids),
+                self.model.owner_id == owner_id
+            )
+            stmt = (
+                delete(gift_list_gift)
+                .where(
+                    gift_list_gift.c.giftlist_id.in_(owned_lists),
+                    gift_list_gift.c.gift_id.in_(gift_ids)
+                )
+            )
+            result = await self.session.execute(stmt)
+            if commit:
                 await self.session.commit()
-            return True
-        except Exception as e:
-            logging.error(f"Error removing gift from list: {e}")
-            await self.session.rollback()
+                fragment_cache.bump(owner_id)
+            return result.rowcount
+        except SQLAlchemyError as e:
+            logging.error(f"Error removing gifts from lists: {e}")
+            if commit:
+                await self.session.rollback()
+            raise
+
+    async def add_gift_to_list(self, list_id: int, gift_id: int, owner_id: int) -> bool:
+        """Add a gift to a gift list; False if it was already there or is not the owner's"""
+        try:
+            return await self.add_gifts_to_lists([list_id], [gift_id], owner_id) > 0
+        except SQLAlchemyError:
+            return False
+
+    async def remove_gift_from_list(self, list_id: int, gift_id: int, owner_id: int) -> bool:
+        """Remove a gift from a gift list; False if it was not in the list"""
+        try:
+            return await self.remove_gifts_from_lists([list_id], [gift_id], owner_id) > 0
+        except SQLAlchemyError:
             return False
         
     async def get_giftlists_with_gifts(self, owner_id: int):
@@ -397,17 +960,22 @@ class UserListDAO(BaseDAO[UserList]):
             logging.error(f"Error getting user lists: {e}")
             raise
 
-    async def toggle_member(self, list_id: int, is_active: bool) -> bool:
-        """Toggle member status in the list"""
+    async def toggle_member(self, list_id: int, is_active: bool, owner_id: int, commit: bool = True) -> bool:
+        """Toggle member status in one of owner_id's lists"""
         try:
             user_list = await self.session.get(self.model, list_id)
-            if user_list:
+            if user_list and user_list.user_id == owner_id:
                 user_list.description = 'active' if is_active else 'inactive'
-                await self.session.commit()
+                if commit:
+                    await self.session.commit()
+                else:
+                    await self.session.flush()
                 return True
             return False
         except SQLAlchemyError as e:
             logging.error(f"Error toggling member status: {e}")
+            if not commit:
+                raise
             await self.session.rollback()
             return False
 
@@ -428,19 +996,90 @@ class ContactDAO(BaseDAO[Contact]):
             logging.error(f"Error getting user contacts: {e}")
             raise
 
-    async def add_contact(self, contact_data: dict) -> Optional[Contact]:
+    async def add_contact(self, contact_data: dict, commit: bool = True) -> Optional[Contact]:
         """Add a new contact"""
         try:
             contact = self.model(**contact_data)
             self.session.add(contact)
-            await self.session.commit()
-            await self.session.refresh(contact)
+            if commit:
+                await self.session.commit()
+                await self.session.refresh(contact)
+            else:
+                await self.session.flush()
             return contact
         except SQLAlchemyError as e:
-            await self.session.rollback()
+            if commit:
+                await self.session.rollback()
             logging.error(f"Error adding contact: {e}")
             raise
 
+    async def upsert_contacts(self, user_id: int, contacts: List[dict], commit: bool = True) -> int:
+        """
+        Bulk insert-or-update contacts on uq_user_contact.
+
+        Each contact dict has contact_telegram_id, username, first_name and
+        last_name; returns the number of rows written.
+        """
+        # ON CONFLICT DO UPDATE may touch a row only once per statement
+        rows = {
+            contact["contact_telegram_id"]: {
+                "user_id": user_id,
+                "contact_telegram_id": contact["contact_telegram_id"],
+                "username": contact.get("username"),
+                "first_name": contact.get("first_name") or "",
+                "last_name": contact.get("last_name")
+            }
+            for contact in contacts
+        }
+        rows = list(rows.values())
+        if not rows:
+            return 0
+        try:
+            count = 0
+            # Stay well below asyncpg's 32767 bind parameter limit
+            for i in range(0, len(rows), CONTACT_UPSERT_BATCH_SIZE):
+                stmt = pg_insert(self.model).values(rows[i:i + CONTACT_UPSERT_BATCH_SIZE])
+                stmt = stmt.on_conflict_do_update(
+                    # Same columns as uq_user_contact (unnamed in init_schema.sql)
+                    index_elements=["user_id", "contact_telegram_id"],
+                    set_={
+                        "username": stmt.excluded.username,
+                        "first_name": stmt.excluded.first_name,
+                        "last_name": stmt.excluded.last_name,
+                        "updated_at": func.now()
+                    }
+                )
+                result = await self.session.execute(stmt)
+                count += result.rowcount
+            if commit:
+                await self.session.commit()
+            return count
+        except SQLAlchemyError as e:
+            if commit:
+                await self.session.rollback()
+            logging.error(f"Error upserting contacts: {e}")
+            raise
+
+    async def remove_contacts_by_telegram_ids(self, user_id: int, telegram_ids: List[int], commit: bool = True) -> int:
+        """Bulk delete the user's contacts with the given Telegram ids"""
+        if not telegram_ids:
+            return 0
+        try:
+            result = await self.session.execute(
+                delete(self.model).where(
+                    self.model.user_id == user_id,
+                    self.model.contact_telegram_id.in_(telegram_ids)
+                )
+            )
+            if commit:
+                await self.session.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            if commit:
+                await self.session.rollback()
+            logging.error(f"Error removing contacts: {e}")
+            raise
+
     async def remove_contact(self, user_id: int, contact_id: int) -> bool:
         """Remove contact if it belongs to user"""
         try:
@@ -476,3 +1115,256 @@ class ContactDAO(BaseDAO[Contact]):
         except SQLAlchemyError as e:
             logging.error(f"Error getting contact by telegram_id: {e}")
             raise
+
+
+class ContactSyncDAO(BaseDAO[ContactSyncEntry]):
+    """Per-user address book hashes for delta contact sync"""
+    model = ContactSyncEntry
+
+    async def get_book_hash(self, user_id: int) -> Optional[str]:
+        try:
+            result = await self.session.execute(
+                select(ContactSyncState.book_hash).where(ContactSyncState.user_id == user_id)
+            )
+            return result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting contact sync state: {e}")
+            raise
+
+    async def get_entries(self, user_id: int) -> dict:
+        """phone_key -> (content_hash, contact_telegram_id) of the last sync"""
+        try:
+            result = await self.session.execute(
+                select(self.model.phone_key, self.model.content_hash, self.model.contact_telegram_id)
+                .where(self.model.user_id == user_id)
+            )
+            return {row.phone_key: (row.content_hash, row.contact_telegram_id) for row in result}
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting contact sync entries: {e}")
+            raise
+
+    async def apply(
+        self,
+        user_id: int,
+        upserts: List[dict],
+        removed_keys: List[str],
+        book_hash: Optional[str],
+        entries_count: int,
+        commit: bool = True
+    ):
+        """
+        Write a sync delta: upsert entries (phone_key, content_hash,
+        contact_telegram_id), delete removed ones and store the book hash.
+        """
+        try:
+            for i in range(0, len(upserts), CONTACT_UPSERT_BATCH_SIZE):
+                stmt = pg_insert(self.model).values([
+                    {"user_id": user_id, **entry} for entry in upserts[i:i + CONTACT_UPSERT_BATCH_SIZE]
+                ])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "phone_key"],
+                    set_={
+                        "content_hash": stmt.excluded.content_hash,
+                        "contact_telegram_id": stmt.excluded.contact_telegram_id,
+                        "updated_at": func.now()
+                    }
+                )
+                await self.session.execute(stmt)
+            for i in range(0, len(removed_keys), CONTACT_UPSERT_BATCH_SIZE):
+                await self.session.execute(
+                    delete(self.model).where(
+                        self.model.user_id == user_id,
+                        self.model.phone_key.in_(removed_keys[i:i + CONTACT_UPSERT_BATCH_SIZE])
+                    )
+                )
+            stmt = pg_insert(ContactSyncState).values(
+                user_id=user_id, book_hash=book_hash, entries_count=entries_count
+            )
+            await self.session.execute(stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={
+                    "book_hash": stmt.excluded.book_hash,
+                    "entries_count": stmt.excluded.entries_count,
+                    "updated_at": func.now()
+                }
+            ))
+            if commit:
+                await self.session.commit()
+        except SQLAlchemyError as e:
+            if commit:
+                await self.session.rollback()
+            logging.error(f"Error applying contact sync: {e}")
+            raise
+
+
+class JobDAO(BaseDAO[Job]):
+    """
+    Postgres-backed job queue. Workers claim jobs with FOR UPDATE SKIP LOCKED;
+    a job is owned by the claim whose attempt number it carries, so updates
+    from a worker that lost its claim are ignored.
+    """
+    model = Job
+
+    async def enqueue(self, kind: str, payload: dict, user_id: Optional[int] = None, total: int = 0) -> Job:
+        """Create a pending job"""
+        try:
+            job = self.model(kind=kind, payload=payload, user_id=user_id, total=total)
+            self.session.add(job)
+            await self.session.commit()
+            await self.session.refresh(job)
+            return job
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error enqueuing job {kind}: {e}")
+            raise
+
+    async def claim_next(self, kinds: List[str], worker_id: str, lock_timeout: int, max_attempts: int) -> Optional[Job]:
+        """Claim the oldest pending job, or a running one whose worker stopped heartbeating"""
+        try:
+            stale = func.now() - timedelta(seconds=lock_timeout)
+            candidate = (
+                select(self.model.id)
+                .where(
+                    self.model.kind.in_(kinds),
+                    self.model.attempts < max_attempts,
+                    or_(
+                        self.model.status == JobStatusEnum.PENDING.value,
+                        and_(
+                            self.model.status == JobStatusEnum.RUNNING.value,
+                            self.model.locked_at < stale
+                        )
+                    )
+                )
+                .order_by(self.model.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                sa_update(self.model)
+                .where(self.model.id == candidate)
+                .values(
+                    status=JobStatusEnum.RUNNING.value,
+                    attempts=self.model.attempts + 1,
+                    worker_id=worker_id,
+                    locked_at=func.now()
+                )
+                .returning(self.model)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            job = result.scalars().first()
+            await self.session.commit()
+            return job
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error claiming job: {e}")
+            raise
+
+    async def fail_abandoned(self, lock_timeout: int, max_attempts: int) -> int:
+        """Fail running jobs that lost their worker and have no attempts left"""
+        try:
+            result = await self.session.execute(
+                sa_update(self.model)
+                .where(
+                    self.model.status == JobStatusEnum.RUNNING.value,
+                    self.model.locked_at < func.now() - timedelta(seconds=lock_timeout),
+                    self.model.attempts >= max_attempts
+                )
+                .values(status=JobStatusEnum.FAILED.value, error="Worker stopped responding", payload={})
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error failing abandoned jobs: {e}")
+            raise
+
+    async def _update_owned(self, job_id: int, attempt: int, **values) -> bool:
+        try:
+            result = await self.session.execute(
+                sa_update(self.model)
+                .where(
+                    self.model.id == job_id,
+                    self.model.attempts == attempt,
+                    self.model.status == JobStatusEnum.RUNNING.value
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            return result.rowcount == 1
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error updating job {job_id}: {e}")
+            raise
+
+    async def heartbeat(self, job_id: int, attempt: int, **values) -> bool:
+        """Refresh the claim (and optionally progress/total); False if the claim was lost"""
+        return await self._update_owned(job_id, attempt, locked_at=func.now(), **values)
+
+    async def finish(self, job_id: int, attempt: int, result: dict) -> bool:
+        # The payload may hold personal data (phone numbers), drop it once done
+        return await self._update_owned(
+            job_id, attempt, status=JobStatusEnum.DONE.value, result=result, payload={}, locked_at=None
+        )
+
+    async def fail(self, job_id: int, attempt: int, error: str) -> bool:
+        return await self._update_owned(
+            job_id, attempt, status=JobStatusEnum.FAILED.value, error=error, payload={}, locked_at=None
+        )
+
+    async def release(self, job_id: int, attempt: int) -> bool:
+        """Hand a job back to the queue (worker shutdown) without using up an attempt"""
+        return await self._update_owned(
+            job_id, attempt, status=JobStatusEnum.PENDING.value, attempts=self.model.attempts - 1,
+            worker_id=None, locked_at=None
+        )
+
+    async def get_user_job(self, job_id: int, user_id: int) -> Optional[Job]:
+        """Get a job if it belongs to the user"""
+        try:
+            result = await self.session.execute(
+                select(self.model).where(self.model.id == job_id, self.model.user_id == user_id)
+            )
+            return result.scalar_one_or_none()
+        except SQLAlchemyError as e:
+            logging.error(f"Error getting job {job_id}: {e}")
+            raise
+
+
+class ProcessedUpdateDAO:
+    """update_id claims shared by all workers (processed_updates table)"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def claim(self, update_id: int) -> bool:
+        """Record the update; False if some worker already did"""
+        try:
+            result = await self.session.execute(
+                pg_insert(processed_updates)
+                .values(update_id=update_id)
+                .on_conflict_do_nothing()
+                .returning(processed_updates.c.update_id)
+            )
+            claimed = result.scalar_one_or_none() is not None
+            await self.session.commit()
+            return claimed
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error claiming update {update_id}: {e}")
+            raise
+
+    async def purge(self, retention: timedelta) -> int:
+        try:
+            result = await self.session.execute(
+                delete(processed_updates).where(processed_updates.c.created_at < func.now() - retention)
+            )
+            await self.session.commit()
+            return result.rowcount
+        except SQLAlchemyError as e:
+            await self.session.rollback()
+            logging.error(f"Error purging processed updates: {e}")
+            raise
@@ -1,4 +1,7 @@
 
+-- Extensions
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Create ENUMs
 CREATE TYPE event_type_enum AS ENUM (
     'birthday', 'personal', 'professional', 'national', 
@@ -113,6 +116,102 @@ CREATE TABLE contacts (
     UNIQUE (user_id, contact_telegram_id)
 );
 
+CREATE TABLE contact_sync_entries (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER NOT NULL,
+    phone_key VARCHAR NOT NULL,
+    content_hash VARCHAR NOT NULL,
+    contact_telegram_id BIGINT,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT uq_contact_sync_entry UNIQUE (user_id, phone_key)
+);
+
+CREATE TABLE contact_sync_states (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER NOT NULL UNIQUE,
+    book_hash VARCHAR,
+    entries_count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE jobs (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    kind VARCHAR NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    user_id INTEGER,
+    payload JSONB NOT NULL DEFAULT '{}',
+    result JSONB,
+    progress INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker_id VARCHAR,
+    locked_at TIMESTAMPTZ,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_jobs_status_id ON jobs (status, id);
+
+CREATE TABLE invoices (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    gift_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    payload VARCHAR NOT NULL UNIQUE,
+    link VARCHAR NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    FOREIGN KEY (gift_id) REFERENCES gifts(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_invoices_gift_id_amount ON invoices (gift_id, amount);
+
+-- Append-only payment ledger; seq follows commit order (appends take an advisory lock)
+CREATE TABLE payment_ledger (
+    seq BIGSERIAL PRIMARY KEY,
+    payment_id INTEGER NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    gift_id INTEGER NOT NULL,
+    amount FLOAT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Existing payments, for databases created before the ledger
+INSERT INTO payment_ledger (payment_id, user_id, gift_id, amount, created_at)
+SELECT id, user_id, gift_id, amount, COALESCE(timestamp, created_at) FROM payments ORDER BY id;
+
+CREATE TABLE payment_totals_by_gift (
+    gift_id INTEGER PRIMARY KEY,
+    total FLOAT NOT NULL DEFAULT 0,
+    payments INTEGER NOT NULL DEFAULT 0,
+    last_payment_at TIMESTAMPTZ
+);
+
+CREATE TABLE payment_totals_by_user (
+    user_id INTEGER PRIMARY KEY,
+    total FLOAT NOT NULL DEFAULT 0,
+    payments INTEGER NOT NULL DEFAULT 0,
+    last_payment_at TIMESTAMPTZ
+);
+
+CREATE TABLE payment_totals_by_day (
+    day DATE PRIMARY KEY,
+    total FLOAT NOT NULL DEFAULT 0,
+    payments INTEGER NOT NULL DEFAULT 0,
+    last_payment_at TIMESTAMPTZ
+);
+
+CREATE TABLE payment_rollup_state (
+    name VARCHAR PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO payment_rollup_state (name, last_seq) VALUES ('payments', 0);
+
 -- Create association tables
 CREATE TABLE gift_list_gift (
     giftlist_id INTEGER,
@@ -122,6 +221,12 @@ CREATE TABLE gift_list_gift (
     FOREIGN KEY (gift_id) REFERENCES gifts(id) ON DELETE CASCADE
 );
 
+CREATE TABLE processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX ix_processed_updates_created_at ON processed_updates (created_at);
+
 CREATE TABLE calendar_participants (
     calendar_id INTEGER,
     user_id INTEGER,
@@ -138,6 +243,21 @@ CREATE TABLE calendar_gift (
     FOREIGN KEY (gift_id) REFERENCES gifts(id) ON DELETE CASCADE
 );
 
+-- Trigram indexes for user/contact autocomplete
+CREATE INDEX ix_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX ix_profiles_first_name_trgm ON profiles USING gin (first_name gin_trgm_ops);
+CREATE INDEX ix_profiles_last_name_trgm ON profiles USING gin (last_name gin_trgm_ops);
+
+-- The ledger is append-only
+CREATE OR REPLACE FUNCTION forbid_ledger_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'payment_ledger is append-only';
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER payment_ledger_append_only BEFORE UPDATE OR DELETE ON payment_ledger FOR EACH ROW EXECUTE FUNCTION forbid_ledger_changes();
+
 -- Create trigger for updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -156,3 +276,7 @@ CREATE TRIGGER update_userlists_updated_at BEFORE UPDATE ON userlists FOR EACH R
 CREATE TRIGGER update_payments_updated_at BEFORE UPDATE ON payments FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_calendar_events_updated_at BEFORE UPDATE ON calendar_events FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_contacts_updated_at BEFORE UPDATE ON contacts FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_contact_sync_entries_updated_at BEFORE UPDATE ON contact_sync_entries FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_contact_sync_states_updated_at BEFORE UPDATE ON contact_sync_states FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_jobs_updated_at BEFORE UPDATE ON jobs FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_invoices_updated_at BEFORE UPDATE ON invoices FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -1,5 +1,6 @@
 from typing import List, Optional
-from sqlalchemy import ARRAY, JSON, ForeignKey, Integer, String, Table, Enum, Text, UniqueConstraint, text, Column, DateTime, BigInteger, PrimaryKeyConstraint, Boolean, Float
+from sqlalchemy import ARRAY, JSON, ForeignKey, Integer, String, Table, Enum, Text, UniqueConstraint, Index, text, Column, Date, DateTime, BigInteger, PrimaryKeyConstraint, Boolean, Float
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime, timezone
 from app.dao.database import Base, uniq_str_an, array_or_none_an
@@ -45,6 +46,15 @@ class User(Base):
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Trigram index for contact autocomplete (requires pg_trgm)
+        Index(
+            'ix_users_username_trgm', 'username',
+            postgresql_using='gin',
+            postgresql_ops={'username': 'gin_trgm_ops'}
+        ),
+    )
+
 class Profile(Base):
     first_name: Mapped[str]
     last_name: Mapped[str | None]
@@ -54,6 +64,19 @@ class Profile(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), unique=True)
     user: Mapped['User'] = relationship('User', back_populates='profile')
 
+    __table_args__ = (
+        Index(
+            'ix_profiles_first_name_trgm', 'first_name',
+            postgresql_using='gin',
+            postgresql_ops={'first_name': 'gin_trgm_ops'}
+        ),
+        Index(
+            'ix_profiles_last_name_trgm', 'last_name',
+            postgresql_using='gin',
+            postgresql_ops={'last_name': 'gin_trgm_ops'}
+        ),
+    )
+
 class GiftList(Base):
     name: Mapped[str] = mapped_column(unique=True)
     owner_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
@@ -103,15 +126,15 @@ class Gift(Base):
         lazy='selectin'
     )
     
-    def to_dict(self) -> dict:
-        total_paid = sum(payment.amount for payment in self.payments)
+    def to_dict(self, paid_amount: float) -> dict:
+        """paid_amount is the ledger total (LedgerDAO.totals), see GiftDAO.find_one_or_none_by_id"""
         return {
             "id": self.id,
             "name": self.name,
             "description": self.description,
             "price": self.price,
             "owner_id": self.owner_id,
-            "paid_amount": total_paid
+            "paid_amount": paid_amount
         }
 
 class Payment(Base):
@@ -123,6 +146,20 @@ class Payment(Base):
     gift: Mapped['Gift'] = relationship('Gift', back_populates='payments')
     telegram_payment_charge_id: Mapped[str | None] = mapped_column(String, nullable=True)
 
+class Invoice(Base):
+    """Ссылка на оплату Stars (createInvoiceLink), переиспользуется до expires_at"""
+    __tablename__ = 'invoices'
+
+    gift_id: Mapped[int] = mapped_column(ForeignKey('gifts.id', ondelete='CASCADE'), nullable=False)
+    amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    payload: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    link: Mapped[str] = mapped_column(String, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index('ix_invoices_gift_id_amount', 'gift_id', 'amount'),
+    )
+
 # Association table for GiftList and Gift
 gift_list_gift = Table(
     'gift_list_gift',
@@ -132,6 +169,54 @@ gift_list_gift = Table(
 )
 
 
+# Журнал платежей: только добавление, seq растёт в порядке коммитов (см. LedgerDAO.append)
+payment_ledger = Table(
+    'payment_ledger',
+    Base.metadata,
+    Column('seq', BigInteger, primary_key=True, autoincrement=True),
+    Column('payment_id', Integer, nullable=False, unique=True),
+    Column('user_id', Integer, nullable=False),
+    Column('gift_id', Integer, nullable=False),
+    Column('amount', Float, nullable=False),
+    Column('created_at', DateTime(timezone=True), server_default=text('now()'), nullable=False)
+)
+
+
+def _payment_totals(name: str, key: Column) -> Table:
+    return Table(
+        name,
+        Base.metadata,
+        key,
+        Column('total', Float, nullable=False, server_default=text('0')),
+        Column('payments', Integer, nullable=False, server_default=text('0')),
+        Column('last_payment_at', DateTime(timezone=True), nullable=True)
+    )
+
+
+# Итоги по журналу, обновляются инкрементально (app/utils/ledger_rollup.py)
+payment_totals_by_gift = _payment_totals('payment_totals_by_gift', Column('gift_id', Integer, primary_key=True))
+payment_totals_by_user = _payment_totals('payment_totals_by_user', Column('user_id', Integer, primary_key=True))
+payment_totals_by_day = _payment_totals('payment_totals_by_day', Column('day', Date, primary_key=True))
+
+# Последний seq журнала, учтённый в итогах
+payment_rollup_state = Table(
+    'payment_rollup_state',
+    Base.metadata,
+    Column('name', String, primary_key=True),
+    Column('last_seq', BigInteger, nullable=False, server_default=text('0')),
+    Column('updated_at', DateTime(timezone=True), server_default=text('now()'), nullable=False)
+)
+
+
+# update_id уже принятых вебхук-обновлений Telegram (дедупликация между воркерами)
+processed_updates = Table(
+    'processed_updates',
+    Base.metadata,
+    Column('update_id', BigInteger, primary_key=True),
+    Column('created_at', DateTime(timezone=True), server_default=text('now()'), nullable=False, index=True)
+)
+
+
 class EventTypeEnum(str, PyEnum):
     BIRTHDAY = "birthday"
     PERSONAL = "personal"  # личные праздники (годовщины и т.д.)
@@ -268,3 +353,67 @@ class Contact(Base):
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
+
+
+class ContactSyncEntry(Base):
+    """Хэш контакта из адресной книги пользователя на момент последней синхронизации"""
+    __tablename__ = 'contact_sync_entries'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'))
+    phone_key: Mapped[str] = mapped_column(String, nullable=False)  # sha256 нормализованного номера
+    content_hash: Mapped[str] = mapped_column(String, nullable=False)
+    contact_telegram_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'phone_key', name='uq_contact_sync_entry'),
+    )
+
+
+class ContactSyncState(Base):
+    """Состояние синхронизации адресной книги пользователя"""
+    __tablename__ = 'contact_sync_states'
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), unique=True)
+    book_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+    entries_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class JobStatusEnum(str, PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """Фоновая задача (импорт контактов и т.п.), см. app/utils/jobs.py"""
+    __tablename__ = 'jobs'
+
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[str] = mapped_column(String, nullable=False, default=JobStatusEnum.PENDING.value)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    result: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    progress: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    worker_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('ix_jobs_status_id', 'status', 'id'),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.dao.dao import UserDAO, GiftDAO, GiftListDAO, UserListDAO
 from app.dao.session_maker import async_session_maker
 from app.giftme.models import Gift, User, GiftList, UserList
 from app.giftme.schemas import GiftResponse, GiftUpdate
+from app.utils.templating import templates
 import logging
 
 from app.giftme.schemas import (
@@ -20,11 +20,12 @@ from app.giftme.schemas import (
     UserListCreate,
     UserListUpdate,
     UserListResponse,
-    DeleteResponse
+    DeleteResponse,
+    serialize_gift,
+    serialize_gift_list
 )
 
 router = APIRouter(prefix='', tags=['GIFTME'])
-templates = Jinja2Templates(directory='app/templates')
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -80,7 +81,7 @@ async def create_gift(
     gift_dao = GiftDAO(session)
     new_gift = await gift_dao.create_gift(gift.model_dump())
     logging.info(f"Gift created with ID: {new_gift.id} for User ID: {current_user_id}")
-    return new_gift
+    return ORJSONResponse(serialize_gift(new_gift))
 
 async def get_current_user(request: Request):
     # Implement your user retrieval logic here
@@ -96,7 +97,7 @@ async def get_gift(gift_id: int, session: AsyncSession = Depends(async_session_m
     gift = await gift_dao.get_gift_by_id(gift_id)
     if not gift:
         raise HTTPException(status_code=404, detail="Gift not found")
-    return gift
+    return ORJSONResponse(serialize_gift(gift))
 
 @router.put("/gifts/{gift_id}", response_model=GiftResponse, summary="Update a gift by ID")
 async def update_gift(gift_id: int, gift: GiftUpdate, session: AsyncSession = Depends(async_session_maker)):
@@ -104,7 +105,7 @@ async def update_gift(gift_id: int, gift: GiftUpdate, session: AsyncSession = De
     updated_gift = await gift_dao.update_gift(gift_id, gift.dict())
     if not updated_gift:
         raise HTTPException(status_code=404, detail="Gift not found")
-    return updated_gift
+    return ORJSONResponse(serialize_gift(updated_gift))
 
 @router.delete("/gifts/{gift_id}", response_model=DeleteResponse, summary="Delete a gift by ID")
 async def delete_gift(gift_id: int, session: AsyncSession = Depends(async_session_maker)):
@@ -121,7 +122,7 @@ async def delete_gift(gift_id: int, session: AsyncSession = Depends(async_sessio
 async def create_gift_list(gift_list: GiftListCreate, session: AsyncSession = Depends(async_session_maker)):
     gift_list_dao = GiftListDAO(session)
     new_gift_list = await gift_list_dao.create_gift_list(gift_list.dict())
-    return new_gift_list
+    return ORJSONResponse(serialize_gift_list(new_gift_list))
 
 @router.get("/giftlists/{gift_list_id}", response_model=GiftListResponse, summary="Retrieve a gift list by ID")
 async def get_gift_list(gift_list_id: int, session: AsyncSession = Depends(async_session_maker)):
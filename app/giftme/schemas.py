@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Any, Callable, List, Optional, Type
 from pydantic import BaseModel, ConfigDict, Field
 
 
@@ -125,3 +125,22 @@ class DeleteResponse(BaseModel):
     status: str
 
     model_config = ConfigDict(from_attributes=True, use_enum_values=True)
+
+
+def make_serializer(schema: Type[BaseModel]) -> Callable[[Any], dict]:
+    """
+    Build a dumper for trusted ORM objects using the schema's field names.
+
+    Skips pydantic validation, so only use it for data we loaded ourselves.
+    """
+    fields = tuple(schema.model_fields)
+
+    def serialize(obj: Any) -> dict:
+        return {name: getattr(obj, name) for name in fields}
+
+    return serialize
+
+
+serialize_gift = make_serializer(GiftResponse)
+serialize_gift_list = make_serializer(GiftListResponse)
+serialize_user_list = make_serializer(UserListResponse)
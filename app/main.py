@@ -1,7 +1,8 @@
+import hmac
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from aiogram.types import Update
 from app.middleware.https import CustomHTTPSRedirectMiddleware
@@ -12,6 +13,17 @@ from app.config import settings
 from app.giftme.router import router as giftme_router
 from app.twa.router import router as twa_router
 from app.middleware.auth import TelegramWebAppMiddleware
+from app.middleware.compression import CompressionMiddleware, compression_stats, no_compression
+from app.utils.bot_identity import bot_identity
+from app.utils.templating import precompile_templates
+from app.utils.jobs import job_runner
+from app.utils.ledger_rollup import ledger_rollup
+from app.utils.rate_limiter import bot_api_limiter, broadcast_limiter, mtproto_limiter
+from app.utils.update_queue import update_queue
+from app.service.InvoiceService import invoice_service
+from app.service.PaymentService import pre_checkout_validator
+from app.utils.telegram_client import TelegramContactsService
+from app.utils.static_assets import AssetStaticFiles, build_static_assets, BUILD_DIR as STATIC_BUILD_DIR
 
 # Настройка логирования
 logging.basicConfig(
@@ -25,8 +37,19 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом бота"""
     try:
+        build_static_assets()
+        precompile_templates()
         logger.info("Starting bot setup...")
         dp.include_router(bot_router)
+        await bot_identity.start()
+        try:
+            await TelegramContactsService.get_instance()
+        except Exception as e:
+            # Contacts features stay unavailable, the rest of the app still starts
+            logger.error(f"Telethon client not started: {e}")
+        await job_runner.start()
+        await ledger_rollup.start()
+        await update_queue.start()
         await start_bot()
         
         # Устанавливаем вебхук только если мы не в режиме разработки
@@ -34,6 +57,7 @@ async def lifespan(app: FastAPI):
             webhook_url = settings.get_webhook_url()
             await bot.set_webhook(
                 url=webhook_url,
+                secret_token=WEBHOOK_SECRET,
                 allowed_updates=dp.resolve_used_update_types(),
                 drop_pending_updates=True
             )
@@ -47,13 +71,24 @@ async def lifespan(app: FastAPI):
         logger.info("Shutting down bot...")
         if not settings.IS_DEV:
             await bot.delete_webhook()
+        await update_queue.stop()
         await stop_bot()
+        await bot_identity.stop()
+        await job_runner.stop()
+        await ledger_rollup.stop()
+        await TelegramContactsService.shutdown()
+        await bot_api_limiter.stop()
+        await broadcast_limiter.stop()
+        await mtproto_limiter.stop()
         logger.info("Bot shutdown complete")
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
 
+WEBHOOK_SECRET = settings.get_webhook_secret()
+WEBHOOK_SECRET_BYTES = WEBHOOK_SECRET.encode()
+
 # Создаем приложение FastAPI
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add HTTPS redirect middleware in production
 if not settings.IS_DEV:
@@ -63,8 +98,8 @@ if not settings.IS_DEV:
         exclude_hosts=["giftme-avalabs.amvera.io"]  # Add your production domain
     )
 
-# Настройка для раздачи статических файлов с правильным путем
-app.mount("/static", StaticFiles(directory="app/static", html=True, check_dir=True), name="static")
+# Настройка для раздачи статических файлов: fingerprinted + pre-compressed (собираются в lifespan)
+app.mount("/static", AssetStaticFiles(directory=STATIC_BUILD_DIR, html=True, check_dir=False), name="static")
 
 # Добавляем middleware
 app.add_middleware(TelegramWebAppMiddleware)
@@ -75,6 +110,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    exclude_paths=["/static", "/webhook"]
+)
 
 # Подключаем роутеры
 app.include_router(giftme_router)
@@ -89,16 +129,31 @@ async def log_requests(request: Request, call_next):
     return response
 
 @app.post("/webhook")
-async def webhook(request: Request) -> None:
-    """Обработчик вебхуков от Telegram"""
+async def webhook(request: Request):
+    """Обработчик вебхуков от Telegram: только проверка и постановка в очередь"""
+    # Дешевые проверки до чтения и разбора тела
+    secret = request.headers.get("x-telegram-bot-api-secret-token", "")
+    if not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET_BYTES):
+        return Response(status_code=403)
+    content_length = request.headers.get("content-length")
+    if content_length is not None and (not content_length.isdigit() or int(content_length) > settings.WEBHOOK_MAX_BODY_SIZE):
+        return Response(status_code=413)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.WEBHOOK_MAX_BODY_SIZE:
+            return Response(status_code=413)
+
     try:
-        logger.info("Received webhook request")
-        update = Update.model_validate(await request.json(), context={"bot": bot})
-        await dp.feed_update(bot, update)
-        logger.info("Update processed successfully")
+        update = Update.model_validate_json(body, context={"bot": bot})
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
-        raise
+        logger.error(f"Invalid webhook update: {e}")
+        raise HTTPException(status_code=400, detail="Invalid update")
+
+    if not await update_queue.put(update):
+        # Telegram redelivers updates answered with an error
+        raise HTTPException(status_code=503, detail="Update queue is full")
 
 @app.get("/health")
 async def health_check():
@@ -108,5 +163,29 @@ async def health_check():
         "environment": "vercel" if not settings.IS_DEV else "development"
     }
 
+def require_metrics_token(request: Request):
+    """/metrics is outside /twa, so it carries its own bearer token check"""
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404)
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token), Depends(no_compression)])
+async def metrics():
+    """Runtime counters of the in-process subsystems"""
+    return {
+        "compression": compression_stats.snapshot(),
+        "webhook": update_queue.snapshot(),
+        "invoices": invoice_service.snapshot(),
+        "pre_checkout": pre_checkout_validator.snapshot(),
+        "ledger_rollup": ledger_rollup.snapshot(),
+        "telegram": {
+            "bot_api": bot_api_limiter.snapshot(),
+            "mtproto": mtproto_limiter.snapshot(),
+            "broadcast": broadcast_limiter.snapshot()
+        }
+    }
+
 # Экспортируем handler для Vercel
 handler = app
@@ -0,0 +1,163 @@
+import gzip
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.utils.static_assets import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def no_compression(request: Request):
+    """Route dependency that opts a single route out of dynamic compression"""
+    request.state.no_compression = True
+
+
+class CompressionStats:
+    """Counters for the /metrics endpoint"""
+
+    def __init__(self):
+        self.compressed: Dict[str, int] = {"br": 0, "gzip": 0}
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, encoding: str, size_in: int, size_out: int):
+        self.compressed[encoding] += 1
+        self.bytes_in += size_in
+        self.bytes_out += size_out
+
+    def snapshot(self) -> dict:
+        return {
+            "compressed": dict(self.compressed),
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+        }
+
+
+compression_stats = CompressionStats()
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli compression of dynamic responses (HTML, JSON).
+
+    Bodies below minimum_size stay uncompressed, as do responses that are
+    already encoded (pre-compressed static files), excluded path prefixes
+    and routes using the no_compression dependency.
+
+    Every response that could be compressed carries Vary: Accept-Encoding,
+    whether or not this one was, so shared caches key on the coding. When
+    the client negotiated a coding its ETag is made weak, for 304s and
+    small bodies too, so a 304 repeats the tag of the 200 it validates.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        exclude_paths: Optional[List[str]] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = tuple(exclude_paths or [])
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if not encoding:
+            await self.app(scope, receive, self._vary_wrapper(scope, send))
+            return
+
+        start_message = None
+        body_parts = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            status = start_message["status"]
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not self._negotiable(scope, status, headers):
+                compression_stats.skipped += 1
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # The compressed representation is no longer byte-identical
+                headers["ETag"] = f"W/{etag}"
+            if len(body) < self.minimum_size or status in (204, 304) or status < 200:
+                compression_stats.skipped += 1
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            compressed = self._compress(body, encoding)
+            compression_stats.record(encoding, len(body), len(compressed))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _vary_wrapper(self, scope, send):
+        """Identity responses stream through untouched, apart from Vary"""
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                if self._negotiable(scope, message["status"], headers):
+                    headers.add_vary_header("Accept-Encoding")
+            await send(message)
+        return send_wrapper
+
+    def _negotiable(self, scope, status: int, headers: MutableHeaders) -> bool:
+        """Whether the response could be compressed for some Accept-Encoding"""
+        if "content-encoding" in headers:
+            return False
+        if scope.get("state", {}).get("no_compression"):
+            return False
+        # A 304 has no Content-Type; it validates a response that could have been
+        return status == 304 or headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from app.bot.create_bot import bot
+from app.config import settings
+from app.dao.dao import UserDAO
+from app.dao.session_maker import async_session_maker
+from app.giftme.models import Job
+from app.utils.jobs import JobContext, job_runner
+from app.utils.rate_limiter import Priority, RateLimiter, broadcast_limiter, outbound_priority
+
+BROADCAST_JOB = "broadcast"
+# Bad Request descriptions meaning this one chat is gone or closed to the bot;
+# any other Bad Request is about the message and would fail for every recipient
+CHAT_GONE_ERRORS = (
+    "chat not found",
+    "user not found",
+    "peer_id_invalid",
+    "user is deactivated",
+    "group chat was upgraded",
+    "chat_write_forbidden",
+    "not enough rights",
+)
+
+
+class BroadcastAborted(Exception):
+    """The message itself was rejected, so the broadcast cannot reach anyone"""
+
+
+class BroadcastSender:
+    """
+    Sends one text to many chats with bounded concurrency.
+
+    Every message takes a token from the broadcast limiter and then goes
+    through the shared Bot API limiter at bulk priority, so payments and
+    replies to users are always served first. Text is sent as is unless a
+    parse_mode is given, so the bot's default HTML mode cannot reject it.
+    """
+
+    def __init__(self, bot: Bot, limiter: RateLimiter, concurrency: int = 20):
+        self.bot = bot
+        self.limiter = limiter
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(self, chat_id: int, text: str, parse_mode: Optional[str] = None) -> str:
+        """
+        Returns "sent", "blocked" (bot blocked or chat gone) or "failed";
+        raises BroadcastAborted when Telegram rejects the message itself.
+        """
+        async with self._semaphore:
+            await self.limiter.acquire()
+            try:
+                with outbound_priority(Priority.BULK):
+                    await self.bot.send_message(chat_id, text, parse_mode=parse_mode)
+                return "sent"
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                if any(error in e.message.lower() for error in CHAT_GONE_ERRORS):
+                    return "blocked"
+                raise BroadcastAborted(f"Telegram rejected the broadcast message: {e.message}") from e
+            except Exception as e:
+                logging.error(f"Broadcast to {chat_id} failed: {e}")
+                return "failed"
+
+    async def send_many(self, chat_ids: Iterable[int], text: str, parse_mode: Optional[str] = None) -> Counter:
+        tasks = [asyncio.ensure_future(self.send(chat_id, text, parse_mode)) for chat_id in chat_ids]
+        if not tasks:
+            return Counter()
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        if pending:
+            # Aborted: the rest would be rejected the same way
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception():
+                raise task.exception()
+        return Counter(task.result() for task in done)
+
+
+broadcast_sender = BroadcastSender(bot, broadcast_limiter, concurrency=settings.BROADCAST_CONCURRENCY)
+
+
+@job_runner.handler(BROADCAST_JOB)
+async def run_broadcast(job: Job, context: JobContext) -> dict:
+    """
+    Background job: payload {"text": ..., "parse_mode": ...} to every user.
+
+    Recipients are read in id order through a server-side cursor, one
+    BROADCAST_WINDOW at a time; the session is closed before the window is
+    sent, so no connection or transaction is held while messages go out.
+    The last user id of every sent partition is checkpointed; after a
+    restart the job resumes from there (at most one partition is resent).
+    A message Telegram rejects outright (e.g. malformed markup) fails the
+    job instead of counting every recipient as blocked.
+    """
+    state = {"last_user_id": 0, "sent": 0, "blocked": 0, "failed": 0, **(job.result or {})}
+    text = job.payload["text"]
+    parse_mode = job.payload.get("parse_mode")
+    done = state["sent"] + state["blocked"] + state["failed"]
+    async with async_session_maker() as session:
+        total = done + await UserDAO(session).count_users_after(state["last_user_id"])
+    await context.report(done, total=total, force=True)
+
+    started = time.monotonic()
+    sent_before = state["sent"]
+    while True:
+        async with async_session_maker() as session:
+            window = [
+                partition async for partition in UserDAO(session).stream_recipients(
+                    state["last_user_id"], settings.BROADCAST_WINDOW
+                )
+            ]
+        if not window:
+            break
+        for partition in window:
+            counts = await broadcast_sender.send_many(
+                [telegram_id for _, telegram_id in partition], text, parse_mode
+            )
+            for outcome in ("sent", "blocked", "failed"):
+                state[outcome] += counts[outcome]
+            state["last_user_id"] = partition[-1][0]
+            done += len(partition)
+            context.progress = done
+            await context.checkpoint(state)
+
+    elapsed = time.monotonic() - started
+    state["elapsed_seconds"] = round(elapsed, 1)
+    state["messages_per_second"] = round((state["sent"] - sent_before) / elapsed, 2) if elapsed else 0
+    logging.info(f"Broadcast job {job.id} finished: {state}")
+    return state
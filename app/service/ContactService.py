@@ -1,34 +1,231 @@
+import hashlib
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.dao.dao import ContactDAO
+from app.dao.dao import ContactDAO, ContactSyncDAO, UserDAO
+from app.dao.session_maker import async_session_maker
+from app.giftme.models import Contact, Job
+from app.giftme.schemas import UserFilterPydantic
+from app.utils.jobs import JobContext, job_runner
 from app.utils.telegram_client import TelegramContactsService
 import logging
 
+CONTACTS_IMPORT_JOB = "contacts_import"
+CONTACTS_SYNC_JOB = "contacts_sync"
+
+
+def phone_key(phone: Any) -> str:
+    """Stable key of a phone number: sha256 of its digits"""
+    return hashlib.sha256(re.sub(r"\D", "", str(phone)).encode()).hexdigest()
+
+
+def prepare_address_book(phone_contacts: List[Dict[str, Any]]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """phone_key -> (content_hash, contact); later duplicates of a number win"""
+    book = {}
+    for contact in phone_contacts:
+        if not contact.get("phone"):
+            continue
+        key = phone_key(contact["phone"])
+        content = "\x1f".join((key, contact.get("first_name") or "", contact.get("last_name") or ""))
+        book[key] = (hashlib.sha256(content.encode()).hexdigest(), contact)
+    return book
+
+
+def address_book_hash(book: Dict[str, Tuple[str, Dict[str, Any]]]) -> str:
+    digest = hashlib.sha256()
+    for key in sorted(book):
+        digest.update(f"{key}:{book[key][0]}\n".encode())
+    return digest.hexdigest()
+
+
 class ContactsService:
     def __init__(self, session: AsyncSession):
         self._session = session
         self._contact_dao = ContactDAO(session)
         
-    async def import_contacts(self):
-        """Import contacts from Telegram"""
+    async def import_contacts(
+        self,
+        user_id: int,
+        phone_contacts: List[Dict[str, Any]],
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Resolve phone contacts through Telegram and upsert them in one transaction.
+
+        Each CONTACT_IMPORT_CHUNK_SIZE chunk costs one MTProto call, paced by
+        mtproto_limiter at MTPROTO_RATE per second after a MTPROTO_BURST
+        burst: about 50 s for 5000 contacts at the defaults. Callers run it
+        as a CONTACTS_IMPORT_JOB rather than inside a request.
+        """
         try:
-            async with await TelegramContactsService.get_instance() as telegram:
-                contacts = await telegram.get_saved_contacts()
-                
-            imported_contacts = []
-            for contact in contacts:
-                contact_obj = await self._contact_dao.add_contact({
-                    "phone": contact["phone"],
-                    "first_name": contact["first_name"], 
-                    "last_name": contact["last_name"]
-                })
-                imported_contacts.append(contact_obj)
-                
-            return imported_contacts
-                
+            # Telegram calls run before any DB work, no connection is held meanwhile
+            telegram = await TelegramContactsService.get_instance()
+            result = await telegram.import_contacts(phone_contacts, on_progress=on_progress)
+
+            saved = await self._contact_dao.upsert_contacts(user_id, [
+                {
+                    "contact_telegram_id": user["telegram_id"],
+                    "username": user["username"],
+                    "first_name": user["first_name"],
+                    "last_name": user["last_name"]
+                }
+                for user in result["imported_users"]
+            ])
+            registered = await UserDAO(self._session).resolve_registered(
+                [user["telegram_id"] for user in result["imported_users"]]
+            )
+            return {
+                "imported_count": saved,
+                "registered_count": len(registered),
+                "retry_contacts": result["retry_contacts"]
+            }
+
         except Exception as e:
             logging.error(f"Error importing contacts: {e}")
             raise
 
+    async def is_synced(self, user_id: int, phone_contacts: List[Dict[str, Any]]) -> bool:
+        """True if this exact address book was fully synced last time"""
+        book_hash = address_book_hash(prepare_address_book(phone_contacts))
+        return await ContactSyncDAO(self._session).get_book_hash(user_id) == book_hash
+
+    async def sync_contacts(
+        self,
+        user_id: int,
+        phone_contacts: List[Dict[str, Any]],
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Delta sync of the user's address book against the hashes stored by
+        the previous sync. Only added and changed entries go to Telegram;
+        contacts of removed entries are deleted. Entries that Telegram asked
+        to retry are not recorded, so the next sync picks them up again.
+        """
+        try:
+            sync_dao = ContactSyncDAO(self._session)
+            book = prepare_address_book(phone_contacts)
+            book_hash = address_book_hash(book)
+            if await sync_dao.get_book_hash(user_id) == book_hash:
+                return {
+                    "unchanged": True, "added": 0, "changed": 0, "removed": 0,
+                    "imported_count": 0, "registered_count": 0, "retry_count": 0
+                }
+
+            stored = await sync_dao.get_entries(user_id)
+            # End the read transaction, no connection is held during Telegram calls
+            await self._session.commit()
+
+            added = [key for key in book if key not in stored]
+            changed = [key for key in book if key in stored and stored[key][0] != book[key][0]]
+            removed = [key for key in stored if key not in book]
+            to_resolve = added + changed
+
+            result = {"imported_users": [], "resolved": {}, "retry_contacts": []}
+            if to_resolve:
+                telegram = await TelegramContactsService.get_instance()
+                result = await telegram.import_contacts(
+                    [book[key][1] for key in to_resolve], on_progress=on_progress
+                )
+            retry_keys = {phone_key(contact["phone"]) for contact in result["retry_contacts"]}
+
+            upserts = [
+                {
+                    "phone_key": key,
+                    "content_hash": book[key][0],
+                    "contact_telegram_id": result["resolved"].get(i)
+                }
+                for i, key in enumerate(to_resolve)
+                if key not in retry_keys
+            ]
+            # Telegram ids still backed by an address book entry after this sync
+            kept_ids = {entry["contact_telegram_id"] for entry in upserts}
+            kept_ids.update(
+                stored[key][1] for key in book
+                if key in stored and (key in retry_keys or key not in changed)
+            )
+            stale_ids = [
+                stored[key][1] for key in removed + changed
+                if stored[key][1] is not None and stored[key][1] not in kept_ids
+            ]
+
+            saved = await self._contact_dao.upsert_contacts(user_id, [
+                {
+                    "contact_telegram_id": user["telegram_id"],
+                    "username": user["username"],
+                    "first_name": user["first_name"],
+                    "last_name": user["last_name"]
+                }
+                for user in result["imported_users"]
+            ], commit=False)
+            await self._contact_dao.remove_contacts_by_telegram_ids(user_id, stale_ids, commit=False)
+            await sync_dao.apply(
+                user_id,
+                upserts,
+                removed,
+                book_hash=None if retry_keys else book_hash,
+                entries_count=len((stored.keys() - set(removed)) | {entry["phone_key"] for entry in upserts}),
+                commit=False
+            )
+            await self._session.commit()
+            registered = await UserDAO(self._session).resolve_registered(
+                [user["telegram_id"] for user in result["imported_users"]]
+            )
+
+            return {
+                "unchanged": False,
+                "added": len(added),
+                "changed": len(changed),
+                "removed": len(removed),
+                "imported_count": saved,
+                "registered_count": len(registered),
+                "retry_count": len(retry_keys)
+            }
+
+        except Exception as e:
+            await self._session.rollback()
+            logging.error(f"Error syncing contacts: {e}")
+            raise
+
+    async def add_contact(self, user_id: int, telegram_id: int, commit: bool = True) -> Contact:
+        """Add a registered user as a contact by Telegram ID"""
+        user = await UserDAO.find_one_or_none(
+            session=self._session,
+            filters=UserFilterPydantic(telegram_id=telegram_id)
+        )
+        if not user:
+            raise ValueError("User not found")
+
+        existing = await self._contact_dao.get_contact_by_telegram_id(user_id, telegram_id)
+        if existing:
+            return existing
+
+        return await self._contact_dao.add_contact({
+            "user_id": user_id,
+            "contact_telegram_id": telegram_id,
+            "username": user.username,
+            "first_name": user.profile.first_name if user.profile else user.username,
+            "last_name": user.profile.last_name if user.profile else None
+        }, commit=commit)
+
+    async def remove_contact(self, user_id: int, contact_id: int) -> bool:
+        """Remove a contact owned by the user"""
+        return await self._contact_dao.remove_contact(user_id, contact_id)
+
+
+@job_runner.handler(CONTACTS_IMPORT_JOB)
+async def run_contacts_import(job: Job, context: JobContext) -> dict:
+    """Background job: payload {"contacts": [...]} of the importing user"""
+    async with async_session_maker() as session:
+        result = await ContactsService(session).import_contacts(
+            job.user_id, job.payload["contacts"], on_progress=context.report
+        )
+    await context.report(context.total, force=True)
+    return {
+        "imported_count": result["imported_count"],
+        "registered_count": result["registered_count"],
+        "retry_count": len(result["retry_contacts"])
+    }
+
 # from typing import List, Optional
 # from pydantic import BaseModel
 # from sqlalchemy.ext.asyncio import AsyncSession
@@ -195,3 +392,14 @@ class ContactsService:
 #             logging.error(f"Error syncing contacts: {e}")
 #             await self.session.rollback()
 #             raise
+
+
+@job_runner.handler(CONTACTS_SYNC_JOB)
+async def run_contacts_sync(job: Job, context: JobContext) -> dict:
+    """Background job: payload {"contacts": [...]}, the user's full address book"""
+    async with async_session_maker() as session:
+        result = await ContactsService(session).sync_contacts(
+            job.user_id, job.payload["contacts"], on_progress=context.report
+        )
+    await context.report(context.total, force=True)
+    return result
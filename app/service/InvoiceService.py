@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from aiogram import Bot, types
+
+from app.bot.create_bot import bot
+from app.config import settings
+from app.dao.dao import GiftDAO, InvoiceDAO
+from app.dao.session_maker import async_session_maker
+from app.giftme.models import Invoice
+from app.utils.cache import InvoiceLinkCache, IssuedInvoice, invoice_links
+
+STARS_CURRENCY = "XTR"
+
+
+def invoice_gift_id(payload: str) -> int:
+    """Gift id of an invoice payload: "<gift_id>:<token>", or a bare gift id from older send_invoice invoices"""
+    return int(payload.split(":", 1)[0])
+
+
+def _issued(invoice: Invoice) -> IssuedInvoice:
+    return IssuedInvoice(
+        gift_id=invoice.gift_id,
+        amount=invoice.amount,
+        payload=invoice.payload,
+        link=invoice.link,
+        expires_at=invoice.expires_at
+    )
+
+
+class InvoiceService:
+    """
+    Stars invoice links for the Mini App (opened with WebApp.openInvoice).
+
+    A link is created once per (gift, amount) with createInvoiceLink and
+    reused until it expires: from the in-process cache, else from the
+    invoices table, so repeated taps on the pay button cost neither a Bot
+    API call nor a chat message. Concurrent requests for the same link
+    share one creation.
+    """
+
+    def __init__(self, bot: Bot, cache: InvoiceLinkCache, ttl: int = 3600):
+        self.bot = bot
+        self.cache = cache
+        self.ttl = ttl
+        self._pending: Dict[Tuple[int, int, int], asyncio.Future] = {}
+        self.hits = 0
+        self.reused = 0
+        self.created = 0
+
+    async def get_link(self, gift_id: int, amount: int) -> Optional[str]:
+        """Invoice link for paying `amount` Stars towards a gift; None if the gift does not exist"""
+        version = self.cache.version(gift_id)
+        invoice = self.cache.get(gift_id, version, amount)
+        if invoice:
+            self.hits += 1
+            return invoice.link
+
+        # Keyed by version too: a creation started before an invalidation is not shared after it
+        key = (gift_id, version, amount)
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = asyncio.ensure_future(self._issue(gift_id, amount, version))
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # One caller going away must not cancel the creation for the others
+        invoice = await asyncio.shield(future)
+        return invoice.link if invoice else None
+
+    async def _issue(self, gift_id: int, amount: int, version: int) -> Optional[IssuedInvoice]:
+        async with async_session_maker() as session:
+            gift = await GiftDAO(session).get_gift_by_id(gift_id)
+            if not gift:
+                return None
+            invoice = await InvoiceDAO(session).find_active(gift_id, amount)
+            name = gift.name
+
+        if invoice:
+            self.reused += 1
+        else:
+            payload = f"{gift_id}:{secrets.token_urlsafe(12)}"
+            # No DB connection is held during the Bot API call
+            link = await self.bot.create_invoice_link(
+                title=f"🎁 {name}",
+                description=f"Support gift: {name} ({amount} Stars)",
+                payload=payload,
+                provider_token="",  # Empty for Telegram Stars
+                currency=STARS_CURRENCY,
+                prices=[types.LabeledPrice(label=f"Gift: {name[:20]}", amount=amount)]
+            )
+            async with async_session_maker() as session:
+                invoice = await InvoiceDAO(session).add_invoice(
+                    gift_id=gift_id,
+                    amount=amount,
+                    payload=payload,
+                    link=link,
+                    expires_at=datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+                )
+            self.created += 1
+            logging.info(f"Invoice link created for gift {gift_id}, {amount} Stars")
+
+        issued = _issued(invoice)
+        self.cache.set(version, issued)
+        return issued
+
+    async def find(self, payload: str) -> Optional[IssuedInvoice]:
+        """Issued invoice by payload, from the cache or the invoices table"""
+        invoice = self.cache.lookup(payload)
+        if invoice:
+            return invoice
+        async with async_session_maker() as session:
+            row = await InvoiceDAO(session).get_by_payload(payload)
+        if row is None:
+            return None
+        invoice = _issued(row)
+        self.cache.remember(invoice)
+        return invoice
+
+    def snapshot(self) -> dict:
+        return {"hits": self.hits, "reused": self.reused, "created": self.created, "pending": len(self._pending)}
+
+
+invoice_service = InvoiceService(bot, invoice_links, ttl=settings.INVOICE_LINK_TTL)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import math
+from typing import Optional
+
+from aiogram.types import PreCheckoutQuery
+
+from app.config import settings
+from app.dao.dao import GiftDAO
+from app.dao.session_maker import async_session_maker
+from app.service.InvoiceService import STARS_CURRENCY, InvoiceService, invoice_gift_id, invoice_service
+from app.utils.cache import GiftStatus, GiftStatusCache, gift_statuses
+
+
+class PreCheckoutValidator:
+    """
+    Checks a Stars pre-checkout query against its invoice and its gift.
+
+    The issued invoice comes from an in-process cache. The gift status
+    cache is per process and misses payments taken by other workers, so it
+    is only trusted to reject (a deleted or already funded gift stays
+    that way); a payment is approved only after re-reading the gift's
+    price and paid total from the database, which also refreshes the
+    cache. Telegram cancels the payment if we do not answer within 10
+    seconds, so validation is bounded by `timeout`.
+    """
+
+    def __init__(self, statuses: GiftStatusCache, invoices: InvoiceService, timeout: float = 5.0):
+        self.statuses = statuses
+        self.invoices = invoices
+        self.timeout = timeout
+        self.cached_rejections = 0
+        self.db_reads = 0
+        self.approved = 0
+        self.rejected = 0
+
+    async def validate(self, query: PreCheckoutQuery) -> Optional[str]:
+        """None if the payment may go ahead, else the error shown to the payer"""
+        error = await asyncio.wait_for(self._validate(query), self.timeout)
+        if error:
+            self.rejected += 1
+            logging.warning(f"Pre-checkout {query.id} rejected: {error}")
+        else:
+            self.approved += 1
+        return error
+
+    async def _validate(self, query: PreCheckoutQuery) -> Optional[str]:
+        if query.currency != STARS_CURRENCY:
+            return "Unsupported currency"
+        # Bare gift id payloads of the old send_invoice invoices have no record or expiry
+        if ":" not in query.invoice_payload:
+            return "This invoice is no longer valid"
+        try:
+            gift_id = invoice_gift_id(query.invoice_payload)
+        except ValueError:
+            return "Unknown invoice"
+
+        invoice = await self.invoices.find(query.invoice_payload)
+        if invoice is None or invoice.gift_id != gift_id or invoice.amount != query.total_amount:
+            return "This invoice is no longer valid"
+
+        cached = self.statuses.get(gift_id)
+        if cached is not None:
+            error = self.check(cached, query.total_amount)
+            if error:
+                self.cached_rejections += 1
+                return error
+        return self.check(await self.load(gift_id), query.total_amount)
+
+    @staticmethod
+    def check(status: GiftStatus, amount: int) -> Optional[str]:
+        if status.deleted:
+            return "This gift no longer exists"
+        remaining = math.ceil(status.remaining)
+        if remaining <= 0:
+            return "This gift is already fully funded"
+        if amount > remaining:
+            return f"Only {remaining} Stars are left to fund this gift"
+        return None
+
+    async def load(self, gift_id: int) -> GiftStatus:
+        """Current price and paid total from the database, cached for later rejections"""
+        self.db_reads += 1
+        async with async_session_maker() as session:
+            funding = await GiftDAO(session).get_funding(gift_id)
+        if funding is None:
+            return self.statuses.set_deleted(gift_id)
+        return self.statuses.set(gift_id, *funding)
+
+    def snapshot(self) -> dict:
+        return {
+            "cached_rejections": self.cached_rejections,
+            "db_reads": self.db_reads,
+            "approved": self.approved,
+            "rejected": self.rejected,
+        }
+
+
+pre_checkout_validator = PreCheckoutValidator(gift_statuses, invoice_service, timeout=settings.PRE_CHECKOUT_TIMEOUT)
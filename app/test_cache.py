@@ -0,0 +1,60 @@
+import pytest
+
+from app.utils import cache as cache_module
+from app.utils.cache import FragmentCache, TTLCache, etag_matches
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    clock[0] += 4
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_fragment_cache_bump_hides_old_version():
+    fragments = FragmentCache()
+    version = fragments.version(7)
+    fragments.set(7, version, "gifts", "<ul>old</ul>")
+    assert fragments.get(7, version, "gifts") == "<ul>old</ul>"
+
+    fragments.bump(7)
+    assert fragments.version(7) == version + 1
+    assert fragments.get(7, fragments.version(7), "gifts") is None
+    # Other users are untouched
+    assert fragments.version(8) == 0
+
+
+def test_fragment_cache_bump_ignores_unknown_owner():
+    fragments = FragmentCache()
+    fragments.bump(None)
+    assert fragments.version(None) == 0
+
+
+def test_etag_matches_weak_and_list_forms():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.service import PaymentService as payment_module
+from app.service.InvoiceService import invoice_gift_id
+from app.service.PaymentService import PreCheckoutValidator
+from app.utils.cache import GiftStatusCache, IssuedInvoice
+
+
+class StubInvoices:
+    def __init__(self, *invoices: IssuedInvoice):
+        self.invoices = {invoice.payload: invoice for invoice in invoices}
+
+    async def find(self, payload: str):
+        return self.invoices.get(payload)
+
+
+class StubGiftDAO:
+    """GiftDAO.get_funding over a dict of gift_id -> (price, paid total)"""
+
+    funding = {}
+
+    def __init__(self, session):
+        pass
+
+    async def get_funding(self, gift_id: int):
+        return self.funding.get(gift_id)
+
+
+class StubSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def issued(gift_id: int, amount: int, payload: str) -> IssuedInvoice:
+    return IssuedInvoice(
+        gift_id=gift_id,
+        amount=amount,
+        payload=payload,
+        link=f"https://t.me/$invoice-{payload}",
+        expires_at=datetime.now(timezone.utc) + timedelta(hours=1)
+    )
+
+
+def query(payload: str, amount: int, currency: str = "XTR"):
+    return SimpleNamespace(id="q1", currency=currency, invoice_payload=payload, total_amount=amount)
+
+
+@pytest.fixture
+def validator(monkeypatch):
+    StubGiftDAO.funding = {7: (100.0, 0.0)}
+    monkeypatch.setattr(payment_module, "GiftDAO", StubGiftDAO)
+    monkeypatch.setattr(payment_module, "async_session_maker", StubSession)
+    invoices = StubInvoices(issued(7, 50, "7:token"), issued(8, 50, "8:token"))
+    return PreCheckoutValidator(GiftStatusCache(), invoices)
+
+
+def validate(validator: PreCheckoutValidator, q) -> str:
+    return asyncio.run(validator._validate(q))
+
+
+def test_invoice_gift_id():
+    assert invoice_gift_id("42:abcDEF") == 42
+    assert invoice_gift_id("42") == 42
+    with pytest.raises(ValueError):
+        invoice_gift_id("gift:42")
+
+
+def test_gift_status_cache_tracks_payments_and_price():
+    statuses = GiftStatusCache()
+    statuses.set(1, price=100, paid_amount=30)
+    statuses.record_payment(1, 50)
+    statuses.update_price(1, 120)
+    assert statuses.get(1).remaining == 40
+
+    # Payments for gifts that are not cached are not invented
+    statuses.record_payment(2, 10)
+    assert statuses.get(2) is None
+
+
+def test_valid_payment_is_approved(validator):
+    assert validate(validator, query("7:token", 50)) is None
+    assert validator.db_reads == 1
+
+
+def test_wrong_currency_and_unknown_invoices_are_rejected(validator):
+    assert validate(validator, query("7:token", 50, currency="USD")) == "Unsupported currency"
+    assert validate(validator, query("7:other", 50)) == "This invoice is no longer valid"
+    assert validate(validator, query("7:token", 40)) == "This invoice is no longer valid"
+    assert validate(validator, query("8:token", 50)) == "This gift no longer exists"
+
+
+def test_legacy_bare_payload_is_rejected(validator):
+    assert validate(validator, query("7", 50)) == "This invoice is no longer valid"
+
+
+def test_approval_rereads_payments_from_other_workers(validator):
+    validator.statuses.set(7, 100.0, 0.0)
+    # Another worker took 80 Stars; this process's cache has not seen it
+    StubGiftDAO.funding[7] = (100.0, 80.0)
+    assert validate(validator, query("7:token", 50)) == "Only 20 Stars are left to fund this gift"
+    assert validator.statuses.get(7).paid_amount == 80.0
+
+
+def test_cached_rejection_skips_the_database(validator):
+    validator.statuses.set(7, 100.0, 100.0)
+    assert validate(validator, query("7:token", 50)) == "This gift is already fully funded"
+    assert validator.cached_rejections == 1
+    assert validator.db_reads == 0
@@ -0,0 +1,72 @@
+import asyncio
+
+from app.utils.rate_limiter import Priority, RateLimiter, TokenBucket, outbound_priority, _priority
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated
+    for _ in range(3):
+        assert bucket.ready_at(now) == now
+        bucket.take(now)
+    # Empty: the next token arrives after 1 / rate seconds
+    assert bucket.ready_at(now) == now + 0.5
+    assert bucket.ready_at(now + 0.5) == now + 0.5
+
+
+def test_token_bucket_block_defers_until():
+    bucket = TokenBucket(rate=10, capacity=10)
+    now = bucket.updated
+    bucket.block(now + 5)
+    assert bucket.ready_at(now) == now + 5
+
+
+def test_outbound_priority_is_scoped():
+    assert _priority.get() is None
+    with outbound_priority(Priority.BULK):
+        assert _priority.get() is Priority.BULK
+    assert _priority.get() is None
+
+
+def test_waiters_are_granted_in_priority_order():
+    async def run():
+        limiter = RateLimiter("test", global_rate=50, global_burst=1, chat_rate=50, chat_burst=1)
+        await limiter.acquire()  # drains the burst, everything below has to queue
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority=priority)
+            order.append(name)
+
+        tasks = [
+            asyncio.create_task(call("bulk", Priority.BULK)),
+            asyncio.create_task(call("interactive", Priority.INTERACTIVE)),
+            asyncio.create_task(call("payment", Priority.PAYMENT)),
+        ]
+        await asyncio.wait_for(asyncio.gather(*tasks), 2)
+        await limiter.stop()
+        return order, limiter.snapshot()
+
+    order, snapshot = asyncio.run(run())
+    assert order == ["payment", "interactive", "bulk"]
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["granted"]["payment"] == 1
+
+
+def test_busy_chat_does_not_hold_up_other_chats():
+    async def run():
+        limiter = RateLimiter("test", global_rate=1000, global_burst=10, chat_rate=1, chat_burst=1)
+        await limiter.acquire(chat_id=1)
+        order = []
+
+        async def call(chat_id):
+            await limiter.acquire(chat_id=chat_id)
+            order.append(chat_id)
+
+        slow = asyncio.create_task(call(1))
+        await asyncio.wait_for(call(2), 0.5)
+        slow.cancel()
+        await limiter.stop()
+        return order
+
+    assert asyncio.run(run()) == [2]
@@ -0,0 +1,44 @@
+import asyncio
+
+from app.utils.update_dedup import UpdateDeduplicator
+
+
+def test_redelivery_is_detected():
+    dedup = UpdateDeduplicator(window=10)
+    assert not dedup.seen(1)
+    assert dedup.seen(1)
+    assert dedup.duplicates == 1
+
+
+def test_window_forgets_oldest_ids():
+    dedup = UpdateDeduplicator(window=3)
+    for update_id in (1, 2, 3, 4):
+        assert not dedup.seen(update_id)
+    assert not dedup.seen(1)
+    assert dedup.seen(4)
+
+
+def test_forget_lets_a_refused_update_through_again():
+    dedup = UpdateDeduplicator(window=10)
+    dedup.seen(5)
+    dedup.forget(5)
+    assert not dedup.seen(5)
+    assert dedup.seen(5)
+
+
+def test_forgotten_id_is_not_evicted_early_after_readding():
+    dedup = UpdateDeduplicator(window=3)
+    for update_id in (1, 2, 3):
+        dedup.seen(update_id)
+    dedup.forget(1)
+    dedup.seen(4)
+    dedup.seen(1)
+    # 1 is now the newest entry; two more ids must not push it out
+    dedup.seen(5)
+    assert dedup.seen(1)
+    assert dedup.snapshot()["window"] == 3
+
+
+def test_claim_without_db_always_succeeds():
+    dedup = UpdateDeduplicator(use_db=False)
+    assert asyncio.run(dedup.claim(1))
@@ -1,26 +1,31 @@
 import logging
+from markupsafe import Markup
 from fastapi import APIRouter, Request, HTTPException, Depends, Query
-from fastapi.responses import JSONResponse, RedirectResponse, Response
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response
 
-from pydantic import BaseModel
-from app.dao.dao import ContactDAO, GiftDAO, GiftListDAO, PaymentDAO, UserDAO, UserListDAO
+from pydantic import BaseModel, Field
+from app.dao.dao import ContactDAO, GiftDAO, GiftListDAO, JobDAO, LedgerDAO, PaymentDAO, UserDAO, UserListDAO
 from app.twa.validation import TelegramWebAppValidator
 from app.twa.auth import TWAAuthManager
 from app.dao.session_maker import async_session_maker, connection
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Optional
+from typing import List, Literal, Optional
 from app.config import settings
-from app.giftme.schemas import GiftCreate, GiftListCreate, GiftListResponse, GiftResponse, PaymentCreate, ProfilePydantic, UserFilterPydantic, UserPydantic
+from app.giftme.schemas import GiftCreate, GiftListCreate, GiftListResponse, GiftResponse, PaymentCreate, ProfilePydantic, UserFilterPydantic, UserPydantic, serialize_gift, serialize_gift_list
 from app.utils.telegram_client import TelegramContactsService
-from app.service.ContactService import ContactsService 
+from app.service.ContactService import CONTACTS_IMPORT_JOB, CONTACTS_SYNC_JOB, ContactsService
+from app.service.BroadcastService import BROADCAST_JOB
+from app.service.InvoiceService import invoice_service
+from app.utils.jobs import job_runner
 from app.utils.bot_instance import telegram_bot
-from telethon import functions
+from app.utils.bot_identity import bot_identity
+from app.utils.cache import etag_matches, fragment_cache, gift_page_cache
+from app.utils.templating import templates
 from aiogram import types
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import Message
 
 router = APIRouter(prefix="/twa", tags=["twa"])
-templates = Jinja2Templates(directory="app/templates")
 
 telegram_validator = TelegramWebAppValidator(settings.BOT_TOKEN)
 auth_manager = TWAAuthManager(settings.secret_key)
@@ -65,7 +70,7 @@ async def create_user_list(request: Request, data: dict):
 
             user_list = await user_list_dao.create_user_list(user_list_data)            
 
-            return JSONResponse(status_code=200, content={"id": user_list.id})
+            return ORJSONResponse(status_code=200, content={"id": user_list.id})
 
     except Exception as e:
         logging.error(f"Error creating group: {e}")
@@ -80,12 +85,12 @@ async def toggle_group_status(request: Request, list_id: int, data: dict):
 
         async with async_session_maker() as session:
             user_list_dao = UserListDAO(session)
-            success = await user_list_dao.toggle_member(list_id, data["is_active"])
+            success = await user_list_dao.toggle_member(list_id, data["is_active"], user_id)
             
             if not success:
                 raise HTTPException(status_code=400, detail="Failed to update status")
 
-            return JSONResponse(status_code=200, content={"status": "success"})
+            return ORJSONResponse(status_code=200, content={"status": "success"})
 
     except Exception as e:
         logging.error(f"Error toggling group status: {e}")
@@ -113,13 +118,12 @@ async def main_page(
                 logging.error("User not found for id: {user_id}")
                 return RedirectResponse(url="/twa/error?message=User+not+found")
 
-        bot_info = await telegram_bot.get_me()
         logging.info(f"User authenticated: {user.username}")
 
         response = templates.TemplateResponse("pages/index.html", {
             "request": request,
             "user": user,
-            "bot_username": bot_info.username
+            "bot_username": bot_identity.username
         })
         # Add security headers
         response.headers["Content-Security-Policy"] = "upgrade-insecure-requests"
@@ -140,28 +144,38 @@ async def wishlist_page(
         return RedirectResponse(url="/twa/error?message=User+not+found")
 
     try:
-        async with async_session_maker() as session:
-            gift_list_dao = GiftListDAO(session)
-            gift_lists = await gift_list_dao.get_giftlists_with_gifts(user.id)
-            
-            selected_gift = None
-            selected_gift_lists = []
-            
-            if gift_id:
-                gift_dao = GiftDAO(session)
-                selected_gift = await gift_dao.get_gift_with_lists(gift_id, session)
-                if selected_gift:
-                    selected_gift_lists = [gift_list.id for gift_list in selected_gift.lists]
-            
-            context = {
-                "request": request,
-                "user": user,
-                "gift_lists": gift_lists,
-                "selected_gift": selected_gift,
-                "selected_gift_lists": selected_gift_lists
-            }
+        version = fragment_cache.version(user.id)
+        fragment_name = f"wishlist:{gift_id or ''}"
+        gift_lists_grid = fragment_cache.get(user.id, version, fragment_name)
+
+        if gift_lists_grid is None:
+            async with async_session_maker() as session:
+                gift_list_dao = GiftListDAO(session)
+                gift_lists = await gift_list_dao.get_giftlists_with_gifts(user.id)
+                
+                selected_gift = None
+                selected_gift_lists = []
+                
+                if gift_id:
+                    gift_dao = GiftDAO(session)
+                    selected_gift = await gift_dao.get_gift_with_lists(gift_id, session)
+                    if selected_gift:
+                        selected_gift_lists = [gift_list.id for gift_list in selected_gift.lists]
+
+                gift_lists_grid = templates.get_template("partials/gift_lists_grid.html").render(
+                    gift_lists=gift_lists,
+                    selected_gift=selected_gift,
+                    selected_gift_lists=selected_gift_lists
+                )
+            fragment_cache.set(user.id, version, fragment_name, gift_lists_grid)
             
-            return templates.TemplateResponse("pages/wishlist.html", context)
+        context = {
+            "request": request,
+            "user": user,
+            "gift_lists_grid": Markup(gift_lists_grid)
+        }
+        
+        return templates.TemplateResponse("pages/wishlist.html", context)
 
     except Exception as e:
         logging.error(f"Error in wishlist page: {e}")
@@ -186,19 +200,19 @@ async def create_gift_list(request: Request, gift_list: GiftListCreate):
             if not new_list:
                 raise HTTPException(status_code=500, detail="Failed to create gift list")
                 
-            return GiftListResponse(
-                id=new_list.id,
-                name=new_list.name,
-                owner_id=new_list.owner_id
-            )
+            return ORJSONResponse(serialize_gift_list(new_list))
 
     except Exception as e:
         logging.error(f"Error creating gift list: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 class GiftListToggleRequest(BaseModel):
-    gift_id: int
-    list_id: int
+    # Either a single gift_id/list_id pair or batches via gift_ids/list_ids;
+    # every gift is toggled in every list
+    gift_id: Optional[int] = None
+    list_id: Optional[int] = None
+    gift_ids: List[int] = []
+    list_ids: List[int] = []
     action: str  # 'add' or 'remove'
 
 @router.post("/api/giftlist/toggle", response_model=None)
@@ -208,21 +222,25 @@ async def toggle_gift_in_list(request: Request, toggle_data: GiftListToggleReque
         if not user_id:
             raise HTTPException(status_code=401, detail="Unauthorized")
 
+        gift_ids = toggle_data.gift_ids + ([toggle_data.gift_id] if toggle_data.gift_id else [])
+        list_ids = toggle_data.list_ids + ([toggle_data.list_id] if toggle_data.list_id else [])
+        if not gift_ids or not list_ids:
+            raise HTTPException(status_code=400, detail="No gifts or lists given")
+
         async with async_session_maker() as session:
             gift_list_dao = GiftListDAO(session)
             
             if toggle_data.action == "add":
-                success = await gift_list_dao.add_gift_to_list(toggle_data.list_id, toggle_data.gift_id)
+                changed = await gift_list_dao.add_gifts_to_lists(list_ids, gift_ids, user_id)
             elif toggle_data.action == "remove":
-                success = await gift_list_dao.remove_gift_from_list(toggle_data.list_id, toggle_data.gift_id)
+                changed = await gift_list_dao.remove_gifts_from_lists(list_ids, gift_ids, user_id)
             else:
                 raise HTTPException(status_code=400, detail="Invalid action")
 
-            if not success:
-                raise HTTPException(status_code=400, detail="Failed to update gift list")
-
-            return JSONResponse(status_code=200, content={"status": "success"})
+            return ORJSONResponse(status_code=200, content={"status": "success", "changed": changed})
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error toggling gift in list: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -246,18 +264,119 @@ async def create_gift(request: Request, gift_data: GiftCreate):
             if not new_gift:
                 raise HTTPException(status_code=500, detail="Failed to create gift")
                 
-            return GiftResponse(
-                id=new_gift.id,
-                name=new_gift.name,
-                description=new_gift.description,
-                price=new_gift.price,
-                owner_id=new_gift.owner_id
-            )
+            return ORJSONResponse(serialize_gift(new_gift))
 
     except Exception as e:
         logging.error(f"Error creating gift: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class BatchOperation(BaseModel):
+    op: Literal["gift.create", "giftlist.toggle", "group.toggle", "contact.add"]
+    data: dict
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=100)
+
+async def _batch_gift_create(session, user_id: int, data: dict) -> dict:
+    gift_data = GiftCreate(**{**data, "owner_id": user_id})
+    gift = await GiftDAO(session).create_gift(gift_data.model_dump(), commit=False)
+    return {"id": gift.id}
+
+async def _batch_giftlist_toggle(session, user_id: int, data: dict) -> dict:
+    toggle_data = GiftListToggleRequest(**data)
+    gift_ids = toggle_data.gift_ids + ([toggle_data.gift_id] if toggle_data.gift_id else [])
+    list_ids = toggle_data.list_ids + ([toggle_data.list_id] if toggle_data.list_id else [])
+    if not gift_ids or not list_ids:
+        raise ValueError("No gifts or lists given")
+    gift_list_dao = GiftListDAO(session)
+    if toggle_data.action == "add":
+        changed = await gift_list_dao.add_gifts_to_lists(list_ids, gift_ids, user_id, commit=False)
+    elif toggle_data.action == "remove":
+        changed = await gift_list_dao.remove_gifts_from_lists(list_ids, gift_ids, user_id, commit=False)
+    else:
+        raise ValueError("Invalid action")
+    return {"changed": changed}
+
+async def _batch_group_toggle(session, user_id: int, data: dict) -> dict:
+    success = await UserListDAO(session).toggle_member(
+        int(data["list_id"]), bool(data["is_active"]), user_id, commit=False
+    )
+    if not success:
+        raise ValueError("Failed to update status")
+    return {}
+
+async def _batch_contact_add(session, user_id: int, data: dict) -> dict:
+    contact = await ContactsService(session).add_contact(user_id, int(data["telegram_id"]), commit=False)
+    return {"id": contact.id}
+
+BATCH_HANDLERS = {
+    "gift.create": _batch_gift_create,
+    "giftlist.toggle": _batch_giftlist_toggle,
+    "group.toggle": _batch_group_toggle,
+    "contact.add": _batch_contact_add,
+}
+
+@router.post("/api/batch", response_model=None)
+async def batch(request: Request, batch_request: BatchRequest):
+    """
+    Run several API operations in order in one request and one transaction.
+
+    The batch is all or nothing: the first failing operation rolls back
+    the whole transaction, and the response (400, "committed": false)
+    marks the earlier operations "rolled_back" and the later ones "skipped".
+    """
+    try:
+        user_id = request.state.user_id
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        results = []
+        async with async_session_maker() as session:
+            for index, operation in enumerate(batch_request.operations):
+                handler = BATCH_HANDLERS[operation.op]
+                try:
+                    result = await handler(session, user_id, operation.data)
+                except Exception as e:
+                    logging.error(f"Batch operation {index} ({operation.op}) failed: {e}")
+                    await session.rollback()
+                    results = [{"index": done["index"], "op": done["op"], "status": "rolled_back"} for done in results]
+                    results.append({"index": index, "op": operation.op, "status": "error", "detail": str(e)})
+                    results.extend(
+                        {"index": skipped, "op": batch_request.operations[skipped].op, "status": "skipped"}
+                        for skipped in range(index + 1, len(batch_request.operations))
+                    )
+                    return ORJSONResponse(status_code=400, content={"committed": False, "results": results})
+                results.append({"index": index, "op": operation.op, "status": "success", **result})
+            await session.commit()
+        # Only once committed: the DAOs leave the bump to us with commit=False
+        fragment_cache.bump(user_id)
+
+        return {"committed": True, "results": results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error processing batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/gifts", response_model=List[GiftResponse])
+async def list_gifts(request: Request):
+    """List the current user's gifts"""
+    try:
+        user_id = request.state.user_id
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        async with async_session_maker() as session:
+            gifts = await GiftDAO(session).get_gifts_by_user_id(user_id)
+            return ORJSONResponse([serialize_gift(gift) for gift in gifts])
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error listing gifts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/gifts")
 async def gifts_page(request: Request):
     logging.info("twa/router: Gifts page request")
@@ -266,19 +385,22 @@ async def gifts_page(request: Request):
         logging.error("twa/router: User not found")
         return RedirectResponse(url="/twa/error?message=User+not+found")
 
-    async with async_session_maker() as session:
-        gift_dao = GiftDAO(session)
-        gifts = await gift_dao.get_gifts_by_user_id(user.id)
-        
-        # Get bot information for sharing
-        bot_info = await telegram_bot.get_me()
+    version = fragment_cache.version(user.id)
+    gifts_grid = fragment_cache.get(user.id, version, "gifts")
+
+    if gifts_grid is None:
+        async with async_session_maker() as session:
+            gift_dao = GiftDAO(session)
+            gifts = await gift_dao.get_gifts_with_paid_by_user_id(user.id)
+            gifts_grid = templates.get_template("partials/gifts_grid.html").render(gifts=gifts)
+        fragment_cache.set(user.id, version, "gifts", gifts_grid)
         
     return templates.TemplateResponse("pages/gifts.html", {
         "request": request,
         "user": user,
-        "gifts": gifts,
+        "gifts_grid": Markup(gifts_grid),
         "page_title": "My Gifts",
-        "bot_username": bot_info.username  # Add bot username to context
+        "bot_username": bot_identity.username  # Cached bot username for sharing
     })
 
 @router.get("/groups")
@@ -306,16 +428,16 @@ async def contacts_page(request: Request):
         return RedirectResponse(url="/twa/error?message=User+not+found")
 
     try:
-        contacts_service = TelegramContactsService()
-        await contacts_service.start()
-        contacts = await contacts_service.get_saved_contacts()
         async with async_session_maker() as session:
             contact_dao = ContactDAO(session)
             contacts = await contact_dao.get_user_contacts(user.id)
-            
+            registered = await UserDAO(session).resolve_registered(
+                [contact.contact_telegram_id for contact in contacts]
+            )
+
             return templates.TemplateResponse(
                 "pages/contacts.html",
-                {"request": request, "user": user, "contacts": contacts}
+                {"request": request, "user": user, "contacts": contacts, "registered": registered}
             )
             
     except SQLAlchemyError as e:
@@ -327,7 +449,12 @@ async def contacts_page(request: Request):
     
 @router.post("/api/contacts/import", response_model=None)
 async def import_contacts(request: Request):
-    """Import contacts from phone contacts"""
+    """
+    Import contacts from phone contacts as a background job.
+
+    Telegram paces contact resolution (about 50 s for 5000 contacts at the
+    default MTPROTO_RATE), so this only queues the job; poll /api/jobs/{job_id}.
+    """
     try:
         user_id = request.state.user_id
         if not user_id:
@@ -336,33 +463,95 @@ async def import_contacts(request: Request):
         data = await request.json()
         phone_contacts = data.get("contacts", [])
 
-        async with async_session_maker() as session:
-            # Import contacts via Telegram
-            contacts_service = TelegramContactsService(TelegramContactsService.telegram_bot)
-            result = await contacts_service.import_contacts(phone_contacts)
+        # Large address books outlive the proxy timeout, import in the background
+        job = await job_runner.enqueue(
+            CONTACTS_IMPORT_JOB,
+            {"contacts": phone_contacts},
+            user_id=user_id,
+            total=len(phone_contacts)
+        )
+        return {"status": "queued", "job_id": job.id}
 
-            # Save imported contacts to database
-            contact_dao = ContactDAO(session)
-            for user_info in result["imported_users"]:
-                contact_data = {
-                    "user_id": user_id,
-                    "contact_telegram_id": user_info["telegram_id"],
-                    "username": user_info["username"],
-                    "first_name": user_info["first_name"],
-                    "last_name": user_info["last_name"]
-                }
-                await contact_dao.add_contact(contact_data)
+    except Exception as e:
+        logging.error(f"Error importing contacts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            return {
-                "status": "success",
-                "imported_count": len(result["imported_users"]),
-                "retry_count": len(result["retry_contacts"])
-            }
+@router.post("/api/contacts/sync", response_model=None)
+async def sync_contacts(request: Request):
+    """Delta sync of the full phone address book"""
+    user_id = request.state.user_id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        data = await request.json()
+        phone_contacts = data.get("contacts", [])
+
+        async with async_session_maker() as session:
+            if await ContactsService(session).is_synced(user_id, phone_contacts):
+                return {"status": "unchanged"}
+
+        job = await job_runner.enqueue(
+            CONTACTS_SYNC_JOB,
+            {"contacts": phone_contacts},
+            user_id=user_id,
+            total=len(phone_contacts)
+        )
+        return {"status": "queued", "job_id": job.id}
 
     except Exception as e:
-        logging.error(f"Error importing contacts: {e}")
+        logging.error(f"Error syncing contacts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+class BroadcastRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=4096)
+    parse_mode: Optional[Literal["HTML", "MarkdownV2"]] = None  # Plain text by default
+
+@router.post("/api/admin/broadcast", response_model=None)
+async def start_broadcast(data: BroadcastRequest, request: Request):
+    """Queue an announcement to all users (admins only)"""
+    user = request.state.user
+    if not user or user.telegram_id not in settings.ADMIN_IDS:
+        raise HTTPException(status_code=403, detail="Admins only")
+
+    job = await job_runner.enqueue(
+        BROADCAST_JOB, {"text": data.text, "parse_mode": data.parse_mode}, user_id=user.id
+    )
+    return {"status": "queued", "job_id": job.id}
+
+@router.get("/api/admin/payments/daily", response_model=None)
+async def get_daily_payments(request: Request, days: int = Query(30, ge=1, le=366)):
+    """Daily payment totals from the ledger rollups (admins only)"""
+    user = request.state.user
+    if not user or user.telegram_id not in settings.ADMIN_IDS:
+        raise HTTPException(status_code=403, detail="Admins only")
+
+    async with async_session_maker() as session:
+        return {"days": await LedgerDAO(session).daily_totals(days)}
+
+@router.get("/api/payments/summary", response_model=None)
+async def get_payment_summary(request: Request):
+    """What the current user has paid in total"""
+    user_id = request.state.user_id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async with async_session_maker() as session:
+        return await LedgerDAO(session).user_totals(user_id)
+
+@router.get("/api/jobs/{job_id}", response_model=None)
+async def get_job_status(job_id: int, request: Request):
+    """Progress and result of a background job"""
+    user_id = request.state.user_id
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    async with async_session_maker() as session:
+        job = await JobDAO(session).get_user_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
 @router.post("/api/contacts", response_model=None)
 async def add_contact(request: Request):
     """Add a contact"""
@@ -379,7 +568,7 @@ async def add_contact(request: Request):
         async with async_session_maker() as session:
             contact_service = ContactsService(session)
             await contact_service.add_contact(user_id, telegram_id)
-            return JSONResponse({"status": "success"})
+            return ORJSONResponse({"status": "success"})
 
     except Exception as e:
         logging.error(f"Error adding contact: {e}")
@@ -400,7 +589,7 @@ async def remove_contact(request: Request, contact_id: int):
             if not success:
                 raise HTTPException(status_code=404, detail="Contact not found")
 
-            return JSONResponse({"status": "success"})
+            return ORJSONResponse({"status": "success"})
 
     except Exception as e:
         logging.error(f"Error removing contact: {e}")
@@ -432,8 +621,12 @@ async def error_page(request: Request, message: Optional[str] = Query(None)):
     })
 
 @router.get("/api/contacts", response_model=None)
-async def get_contacts(request: Request):
-    """Get user contacts"""
+async def get_contacts(
+    request: Request,
+    q: Optional[str] = Query(None, max_length=64),
+    limit: int = Query(20, ge=1, le=50)
+):
+    """Autocomplete users by username or profile name, own contacts first"""
     try:
         user_id = request.state.user_id
         if not user_id:
@@ -441,13 +634,7 @@ async def get_contacts(request: Request):
 
         async with async_session_maker() as session:
             user_dao = UserDAO(session)
-            users = await user_dao.get_all_users()  
-            contacts = [
-                {"id": user.id, "username": user.username}
-                for user in users
-                if user.id != user_id
-            ]
-            return contacts
+            return await user_dao.search_users(user_id, q or "", limit)
 
     except Exception as e:
         logging.error(f"Error getting contacts: {e}")
@@ -455,36 +642,30 @@ async def get_contacts(request: Request):
 
 @router.get("/api/contacts/telegram", response_model=None)
 async def get_telegram_contacts(request: Request):
-    """Get user's Telegram contacts"""
+    """Get user's contacts that are registered users"""
     try:
         user_id = request.state.user_id
         if not user_id:
             raise HTTPException(status_code=401, detail="Unauthorized")
 
         async with async_session_maker() as session:
-            user = await UserDAO.find_by_id(session, user_id)
-            if not user or not user.telegram_id:
-                raise HTTPException(status_code=400, detail="Telegram ID not found")
+            contacts = await ContactDAO(session).get_user_contacts(user_id)
+            registered = await UserDAO(session).resolve_registered(
+                [contact.contact_telegram_id for contact in contacts]
+            )
 
-            # Получаем контакты пользователя через Telegram API
-            # telegram_contacts = await get_telegram_user_contacts(user.telegram_id)
-            
-            # user_dao = UserDAO(session)
-            # registered_users = await user_dao.get_users_by_telegram_ids(
-            #     [contact['id'] for contact in telegram_contacts]
-            # )
-            
-            # Создаем маппинг telegram_id -> user_id
-            # user_mapping = {user.telegram_id: user.id for user in registered_users}
-            
-            # Добавляем user_id к контактам, если пользователь зарегистрирован
-            # contacts_with_ids = [
-            #     {**contact, 'id': user_mapping.get(contact['id'])}
-            #     for contact in telegram_contacts
-            #     if contact['id'] in user_mapping
-            # ]
-            
-            return [{"id": 1, "username": "test"}]
+        # Только контакты, зарегистрированные в приложении, с их user_id
+        return [
+            {
+                "id": registered[contact.contact_telegram_id],
+                "telegram_id": contact.contact_telegram_id,
+                "username": contact.username,
+                "first_name": contact.first_name,
+                "last_name": contact.last_name
+            }
+            for contact in contacts
+            if contact.contact_telegram_id in registered
+        ]
 
     except Exception as e:
         logging.error(f"Error getting Telegram contacts: {e}")
@@ -521,19 +702,8 @@ async def get_saved_contacts(request: Request):
         if not user_id:
             raise HTTPException(status_code=401, detail="Unauthorized")
 
-        contacts_service = TelegramContactsService()
-        # Use getSaved method from contacts functions
-        saved_contacts = await contacts_service.client(functions.contacts.GetSavedRequest())
-
-        # Format response
-        contacts = []
-        for contact in saved_contacts:
-            contacts.append({
-                "phone": contact.phone,
-                "first_name": contact.first_name,
-                "last_name": contact.last_name,
-                "date": contact.date
-            })
+        contacts_service = await TelegramContactsService.get_instance()
+        contacts = await contacts_service.get_saved_contacts()
 
         return {"contacts": contacts}
             
@@ -543,60 +713,47 @@ async def get_saved_contacts(request: Request):
 
 @router.post("/api/payments/{gift_id}/pay")
 async def initiate_payment(gift_id: int, request: Request):
-    """Initiate Telegram Stars payment for a gift"""
+    """Get a Telegram Stars invoice link for a gift, opened by the Mini App"""
     try:
         user = request.state.user
         if not user:
             logging.error("User not found")
             raise HTTPException(status_code=401, detail="Authentication required")
 
-        async with async_session_maker() as session:
-            gift_dao = GiftDAO(session)
-            gift = await gift_dao.get_gift_by_id(gift_id)
-            if not gift:
-                logging.error(f"Gift {gift_id} not found")
-                raise HTTPException(status_code=404, detail="Gift not found")
+        # Get payment data from request
+        try:
+            payload = await request.json()
+        except Exception as e:
+            logging.error(f"Invalid JSON in request body: {e}")
+            raise HTTPException(status_code=400, detail="Invalid JSON in request body")
 
-            # Get payment data from request
-            try:
-                payload = await request.json()
-            except Exception as e:
-                logging.error(f"Invalid JSON in request body: {e}")
-                raise HTTPException(status_code=400, detail="Invalid JSON in request body")
+        amount = float(payload.get('amount', 0))
 
-            amount = float(payload.get('amount', 0))
-            
-            # Convert to Stars
-            stars_amount = max(1, round(amount))
-            amount_in_units = stars_amount 
-
-            # Create Stars invoice
-            try:
-                result: Message = await telegram_bot.send_invoice(
-                    chat_id=user.telegram_id,
-                    title=f"🎁 {gift.name}",
-                    description=f"Support gift: {gift.name} ({stars_amount} Stars)",
-                    payload=str(gift_id),
-                    provider_token="",  # Empty for Telegram Stars
-                    currency="XTR",  # Telegram Stars currency
-                    prices=[types.LabeledPrice(
-                        label=f"Gift: {gift.name[:20]}",
-                        amount=amount_in_units
-                    )],
-                    start_parameter=f"gift_{gift_id}",
-                    need_shipping_address=False,
-                    is_flexible=False
-                )
-                logging.info(f"Payment invoice sent: {result.message_id}")
-                # TODO Check could invoice should be saved in database
-                
-                return {"status": "success", "message": "Payment invoice sent"}
-            except Exception as e:
-                logging.error(f"Error sending Stars invoice: {e}")
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to create Stars payment"
-                )
+        # Convert to Stars
+        stars_amount = max(1, round(amount))
+
+        # Links are cached per (gift, amount), repeated taps reuse them
+        try:
+            invoice_link = await invoice_service.get_link(gift_id, stars_amount)
+        except TelegramRetryAfter as e:
+            logging.error(f"Flood wait creating Stars invoice link: {e.retry_after}s")
+            raise HTTPException(
+                status_code=503,
+                detail="Telegram is busy, try again shortly",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        except Exception as e:
+            logging.error(f"Error creating Stars invoice link: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to create Stars payment"
+            )
+
+        if not invoice_link:
+            logging.error(f"Gift {gift_id} not found")
+            raise HTTPException(status_code=404, detail="Gift not found")
+
+        return {"status": "success", "invoice_link": invoice_link}
 
     except HTTPException:
         raise
@@ -636,7 +793,7 @@ async def payment_callback(
             payment_dao = PaymentDAO(session)
             await payment_dao.add_payment(payment)
 
-            return JSONResponse({"status": "success"})
+            return ORJSONResponse({"status": "success"})
 
     except Exception as e:
         logging.error(f"Error processing payment callback: {e}")
@@ -715,22 +872,40 @@ async def direct_auth(auth_request: DirectAuthRequest):
 @router.get("/public/gifts/{gift_id}")
 async def public_gift_detail(request: Request, gift_id: int):
     try:
-        async with async_session_maker() as session:
-            gift_dao = GiftDAO(session)
-            gift = await gift_dao.get_gift_by_id(gift_id)
-            if not gift:
-                raise HTTPException(status_code=404, detail="Gift not found")
+        user = getattr(request.state, "user", None)
+        viewer_id = user.id if user else None
+        version = gift_page_cache.version(gift_id)
 
-            # Get bot information
-            bot_info = await telegram_bot.get_me()
-
-            # Pass 'user' from request state to the template
-            return templates.TemplateResponse("pages/gift_detail.html", {
-                "request": request,
-                "gift": gift,
-                "bot_username": bot_info.username,
-                "user": request.state.user  # Add this line
-            })
+        page = gift_page_cache.get(gift_id, version, viewer_id)
+        if not page:
+            async with async_session_maker() as session:
+                gift_dao = GiftDAO(session)
+                page_data = await gift_dao.get_gift_page_data(gift_id)
+                if not page_data:
+                    raise HTTPException(status_code=404, detail="Gift not found")
+                gift, paid_amount, last_modified = page_data
+
+                # Pass 'user' from request state to the template
+                rendered = templates.TemplateResponse("pages/gift_detail.html", {
+                    "request": request,
+                    "gift": gift,
+                    "paid_amount": paid_amount,
+                    "bot_username": bot_identity.username,
+                    "user": user
+                })
+            page = gift_page_cache.set(gift_id, version, viewer_id, rendered.body, last_modified)
+
+        headers = {
+            "ETag": page.etag,
+            "Last-Modified": page.last_modified,
+            # Page depends on auth headers, so only the client may keep it
+            "Cache-Control": "private, no-cache"
+        }
+        if etag_matches(request.headers.get("if-none-match"), page.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=page.body, media_type="text/html", headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching gift details: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -738,12 +913,10 @@ async def public_gift_detail(request: Request, gift_id: int):
 @router.get("/api/bot-info")
 async def get_bot_info():
     """Get bot information"""
-    try:
-        bot_info = await telegram_bot.get_me()
-        return {"username": bot_info.username}
-    except Exception as e:
-        logging.error(f"Error getting bot info: {e}")
+    if not bot_identity.username:
+        logging.error("Bot identity is not available")
         raise HTTPException(status_code=500, detail="Failed to get bot information")
+    return {"username": bot_identity.username}
 
 @router.get("/api/auth/validate")
 async def validate_auth(request: Request):
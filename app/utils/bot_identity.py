@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot
+
+from app.config import settings
+from app.utils.bot_instance import telegram_bot
+
+
+class BotIdentity:
+    """
+    Process-wide cache of the bot's own identity (getMe).
+
+    Fetched once at startup from the app lifespan and refreshed in the
+    background, so request handlers never call the Bot API for it.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        refresh_interval: int = 3600,
+        retry_interval: int = 30,
+        fallback_username: Optional[str] = None
+    ):
+        self.bot = bot
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.id: Optional[int] = None
+        self.username: Optional[str] = fallback_username
+        self.first_name: Optional[str] = None
+        self.loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """Fetch getMe and update the cached identity, keeping the old one on failure"""
+        try:
+            me = await self.bot.get_me()
+            self.id = me.id
+            self.username = me.username
+            self.first_name = me.first_name
+            self.loaded = True
+            return True
+        except Exception as e:
+            logging.error(f"Error refreshing bot identity: {e}")
+            return False
+
+    async def start(self):
+        """Load the identity and start the background refresh task"""
+        if not await self.refresh():
+            logging.warning(f"Bot identity unavailable at startup, using fallback username: {self.username}")
+        if not self._task:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            # Retry quickly until the first successful fetch
+            await asyncio.sleep(self.refresh_interval if self.loaded else self.retry_interval)
+            await self.refresh()
+
+
+bot_identity = BotIdentity(
+    telegram_bot,
+    refresh_interval=settings.BOT_INFO_REFRESH_SECONDS,
+    fallback_username=settings.BOT_USERNAME
+)
@@ -1,7 +1,14 @@
 
 from aiogram import Bot
 from app.config import settings
+from app.utils.rate_limiter import RateLimitMiddleware, bot_api_limiter
 
 token=settings.BOT_TOKEN
 
 telegram_bot = Bot(token)
+# Same token as app.bot.create_bot.bot, so both share one limiter
+telegram_bot.session.middleware(RateLimitMiddleware(
+    bot_api_limiter,
+    max_retries=settings.TELEGRAM_MAX_RETRIES,
+    max_retry_after=settings.TELEGRAM_MAX_RETRY_AFTER
+))
@@ -0,0 +1,265 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+
+class TTLCache:
+    """Small in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: bytes
+    etag: str
+    last_modified: str
+
+
+def http_date(value: datetime) -> str:
+    """Format a (naive UTC or aware) datetime as an HTTP-date"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against our ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison (RFC 9110): compression middleware may weaken the tag
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class GiftPageCache:
+    """
+    Rendered public gift pages keyed by gift id, version stamp and viewer.
+
+    Gift and payment writes bump the gift version in this process; other
+    workers pick the change up when their entries expire after the TTL.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 60):
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[int, int] = {}
+
+    def version(self, gift_id: int) -> int:
+        return self._versions.get(gift_id, 0)
+
+    def get(self, gift_id: int, version: int, viewer_id: Optional[int]) -> Optional[CachedPage]:
+        return self._pages.get((gift_id, version, viewer_id))
+
+    def set(self, gift_id: int, version: int, viewer_id: Optional[int], body: bytes, last_modified: datetime) -> CachedPage:
+        page = CachedPage(
+            body=body,
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            last_modified=http_date(last_modified)
+        )
+        self._pages.set((gift_id, version, viewer_id), page)
+        return page
+
+    def invalidate(self, gift_id: int):
+        self._versions[gift_id] = self.version(gift_id) + 1
+
+
+class FragmentCache:
+    """
+    Rendered template fragments keyed by user id and a per-user data version.
+
+    DAO writes to a user's gifts, gift lists or list membership bump the
+    version; as with pages, other workers converge after the TTL.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30):
+        self._fragments = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[int, int] = {}
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: int, version: int, name: str) -> Optional[str]:
+        return self._fragments.get((user_id, version, name))
+
+    def set(self, user_id: int, version: int, name: str, html: str) -> str:
+        self._fragments.set((user_id, version, name), html)
+        return html
+
+    def bump(self, user_id: Optional[int]):
+        if user_id is not None:
+            self._versions[user_id] = self.version(user_id) + 1
+
+
+class RegisteredUserMap:
+    """
+    Bounded telegram_id -> user_id map used to mark registered contacts.
+
+    Telegram ids without an account are cached too (as 0, user ids start at
+    1); registrations in this process update the map right away, other
+    workers see them after the TTL.
+    """
+
+    UNREGISTERED = 0
+
+    def __init__(self, maxsize: int = 100_000, ttl: float = 600):
+        self._ids = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def lookup(self, telegram_ids: Iterable[int]) -> Tuple[Dict[int, int], List[int]]:
+        """Split ids into (registered telegram_id -> user_id, ids not cached)"""
+        found, missing = {}, []
+        for telegram_id in dict.fromkeys(telegram_ids):
+            user_id = self._ids.get(telegram_id)
+            if user_id is None:
+                missing.append(telegram_id)
+            elif user_id != self.UNREGISTERED:
+                found[telegram_id] = user_id
+        return found, missing
+
+    def store(self, resolved: Dict[int, int], queried: Iterable[int]):
+        for telegram_id in queried:
+            self._ids.set(telegram_id, resolved.get(telegram_id, self.UNREGISTERED))
+
+    def remember(self, telegram_id: int, user_id: int):
+        self._ids.set(telegram_id, user_id)
+
+
+@dataclass(frozen=True)
+class IssuedInvoice:
+    gift_id: int
+    amount: int
+    payload: str
+    link: str
+    expires_at: datetime
+
+
+class InvoiceLinkCache:
+    """
+    Invoice links by (gift, amount) and issued invoices by payload.
+
+    Editing or deleting a gift drops its links in this process; other
+    workers skip links issued before the gift's last update when they
+    fall back to the invoices table. Payloads stay resolvable after that,
+    an issued link can still be paid.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 3600):
+        self._links = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._payloads = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[int, int] = {}
+
+    def version(self, gift_id: int) -> int:
+        return self._versions.get(gift_id, 0)
+
+    def get(self, gift_id: int, version: int, amount: int) -> Optional[IssuedInvoice]:
+        invoice = self._links.get((gift_id, version, amount))
+        if invoice is None or invoice.expires_at <= datetime.now(timezone.utc):
+            return None
+        return invoice
+
+    def set(self, version: int, invoice: IssuedInvoice):
+        self._links.set((invoice.gift_id, version, invoice.amount), invoice)
+        self.remember(invoice)
+
+    def lookup(self, payload: str) -> Optional[IssuedInvoice]:
+        return self._payloads.get(payload)
+
+    def remember(self, invoice: IssuedInvoice):
+        self._payloads.set(invoice.payload, invoice)
+
+    def invalidate(self, gift_id: int):
+        self._versions[gift_id] = self.version(gift_id) + 1
+
+
+@dataclass
+class GiftStatus:
+    price: float
+    paid_amount: float
+    deleted: bool = False
+
+    @property
+    def remaining(self) -> float:
+        return self.price - self.paid_amount
+
+
+class GiftStatusCache:
+    """
+    Price and paid total per gift, for pre-checkout validation.
+
+    Gift and payment writes in this process update cached entries in
+    place (without extending their TTL), so they stay warm; payments taken
+    by other workers are not seen until the entry is reloaded, so an
+    entry may overstate what is left to fund and is only good for
+    rejecting a payment, never for approving one.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 30):
+        self._statuses = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, gift_id: int) -> Optional[GiftStatus]:
+        return self._statuses.get(gift_id)
+
+    def set(self, gift_id: int, price: float, paid_amount: float) -> GiftStatus:
+        status = GiftStatus(price=price, paid_amount=paid_amount)
+        self._statuses.set(gift_id, status)
+        return status
+
+    def set_deleted(self, gift_id: int) -> GiftStatus:
+        status = GiftStatus(price=0, paid_amount=0, deleted=True)
+        self._statuses.set(gift_id, status)
+        return status
+
+    def record_payment(self, gift_id: int, amount: float):
+        status = self.get(gift_id)
+        if status is not None:
+            status.paid_amount += amount
+
+    def update_price(self, gift_id: int, price: float):
+        status = self.get(gift_id)
+        if status is not None:
+            status.price = price
+
+
+gift_page_cache = GiftPageCache(ttl=settings.GIFT_PAGE_CACHE_TTL)
+fragment_cache = FragmentCache(ttl=settings.FRAGMENT_CACHE_TTL)
+registered_users = RegisteredUserMap(
+    maxsize=settings.REGISTERED_USER_CACHE_SIZE,
+    ttl=settings.REGISTERED_USER_CACHE_TTL
+)
+invoice_links = InvoiceLinkCache(maxsize=settings.INVOICE_CACHE_SIZE, ttl=settings.INVOICE_LINK_TTL)
+gift_statuses = GiftStatusCache(ttl=settings.GIFT_STATUS_CACHE_TTL)
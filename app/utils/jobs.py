@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.dao.dao import JobDAO
+from app.dao.session_maker import async_session_maker
+from app.giftme.models import Job
+
+
+class JobClaimLost(Exception):
+    """The job was reclaimed by another worker after a missed heartbeat"""
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting"""
+
+    def __init__(self, job: Job, report_interval: float = 1.0):
+        self.job_id = job.id
+        self.attempt = job.attempts
+        self.progress = job.progress
+        self.total = job.total
+        self.report_interval = report_interval
+        self.lost = False
+        self._last_report = 0.0
+
+    async def report(self, progress: int, total: Optional[int] = None, force: bool = False):
+        """Record progress; written to the job row at most once per report_interval"""
+        if self.lost:
+            raise JobClaimLost(f"Job {self.job_id} was claimed by another worker")
+        self.progress = progress
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if not force and now - self._last_report < self.report_interval:
+            return
+        self._last_report = now
+        await self.heartbeat()
+
+    async def heartbeat(self, **values):
+        async with async_session_maker() as session:
+            owned = await JobDAO(session).heartbeat(
+                self.job_id, self.attempt, progress=self.progress, total=self.total, **values
+            )
+        if not owned:
+            self.lost = True
+
+    async def checkpoint(self, state: dict):
+        """Persist resume state in the job's result; a reclaimed job gets it back as job.result"""
+        if self.lost:
+            raise JobClaimLost(f"Job {self.job_id} was claimed by another worker")
+        self._last_report = time.monotonic()
+        await self.heartbeat(result=state)
+        if self.lost:
+            raise JobClaimLost(f"Job {self.job_id} was claimed by another worker")
+
+
+JobHandler = Callable[[Job, JobContext], Awaitable[dict]]
+
+
+class JobRunner:
+    """
+    In-process asyncio workers over the Postgres job table.
+
+    Jobs are claimed with SKIP LOCKED, so several app processes can run
+    workers without running a job twice. A running job heartbeats; if its
+    process dies the job is reclaimed after JOB_LOCK_TIMEOUT, up to
+    JOB_MAX_ATTEMPTS claims. On shutdown running jobs go back to pending.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        poll_interval: float = 2.0,
+        lock_timeout: int = 300,
+        max_attempts: int = 3
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._last_sweep = 0.0
+
+    def handler(self, kind: str):
+        """Decorator registering the handler for a job kind"""
+        def decorator(func: JobHandler) -> JobHandler:
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    async def enqueue(self, kind: str, payload: dict, user_id: Optional[int] = None, total: int = 0) -> Job:
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        async with async_session_maker() as session:
+            job = await JobDAO(session).enqueue(kind, payload, user_id=user_id, total=total)
+        # Local workers pick it up now instead of at the next poll
+        self._wakeup.set()
+        return job
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            logging.info(f"Job runner started with {self.concurrency} workers ({self.worker_id})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logging.error(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _claim(self) -> Optional[Job]:
+        async with async_session_maker() as session:
+            dao = JobDAO(session)
+            if time.monotonic() - self._last_sweep > self.lock_timeout:
+                self._last_sweep = time.monotonic()
+                failed = await dao.fail_abandoned(self.lock_timeout, self.max_attempts)
+                if failed:
+                    logging.warning(f"Failed {failed} abandoned jobs")
+            return await dao.claim_next(list(self.handlers), self.worker_id, self.lock_timeout, self.max_attempts)
+
+    async def _run(self, job: Job):
+        context = JobContext(job)
+        heartbeat = asyncio.create_task(self._heartbeat_loop(context))
+        logging.info(f"Running job {job.id} ({job.kind}), attempt {job.attempts}")
+        try:
+            result = await self.handlers[job.kind](job, context)
+            async with async_session_maker() as session:
+                await JobDAO(session).finish(job.id, context.attempt, result or {})
+        except JobClaimLost as e:
+            logging.warning(str(e))
+        except asyncio.CancelledError:
+            async with async_session_maker() as session:
+                await JobDAO(session).release(job.id, context.attempt)
+            raise
+        except Exception as e:
+            logging.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            async with async_session_maker() as session:
+                await JobDAO(session).fail(job.id, context.attempt, str(e))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat_loop(self, context: JobContext):
+        while not context.lost:
+            await asyncio.sleep(self.lock_timeout / 3)
+            try:
+                await context.heartbeat()
+            except Exception as e:
+                logging.error(f"Error sending heartbeat for job {context.job_id}: {e}")
+
+
+job_runner = JobRunner(
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL,
+    lock_timeout=settings.JOB_LOCK_TIMEOUT,
+    max_attempts=settings.JOB_MAX_ATTEMPTS
+)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+from app.dao.dao import LedgerDAO
+from app.dao.session_maker import async_session_maker
+
+
+class LedgerRollup:
+    """
+    Background task folding new payment_ledger entries into the per-gift,
+    per-user and per-day totals.
+
+    Each run resumes from the last rolled-up sequence number and commits
+    the totals together with the new position, so entries are counted
+    exactly once; with several app processes, one rolls up while the
+    others skip the locked state row. A full batch is followed right away
+    by the next one, otherwise the task sleeps for `interval`.
+    """
+
+    def __init__(self, interval: float = 5.0, batch_size: int = 1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.rolled_up = 0
+        self.errors = 0
+
+    async def run_once(self) -> int:
+        async with async_session_maker() as session:
+            count = await LedgerDAO(session).roll_up(self.batch_size)
+        self.runs += 1
+        self.rolled_up += count
+        return count
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                if await self.run_once() == self.batch_size:
+                    continue
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Error rolling up payment ledger: {e}")
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> dict:
+        return {"runs": self.runs, "rolled_up": self.rolled_up, "errors": self.errors}
+
+
+ledger_rollup = LedgerRollup(
+    interval=settings.LEDGER_ROLLUP_INTERVAL,
+    batch_size=settings.LEDGER_ROLLUP_BATCH_SIZE
+)
@@ -0,0 +1,254 @@
+"""
+Outbound Telegram rate limiting: global and per-chat token buckets, a
+priority queue of waiting calls and deferral on flood waits.
+
+Bot API calls go through RateLimitMiddleware on the aiogram sessions;
+Telethon calls through TelegramContactsService.call. The priority of a
+call comes from its method (payments) or from outbound_priority().
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from aiogram import methods
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.config import settings
+
+
+class Priority(IntEnum):
+    PAYMENT = 0
+    INTERACTIVE = 1
+    NOTIFICATION = 2
+    BULK = 3
+
+
+_priority: ContextVar[Optional[Priority]] = ContextVar("telegram_priority", default=None)
+
+
+@contextmanager
+def outbound_priority(priority: Priority):
+    """Run the Telegram calls of the block with the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """Monotonic time at which a token can be taken"""
+        self._refill(now)
+        at = max(now, self.blocked_until)
+        if self.tokens < 1:
+            at = max(at, now + (1 - self.tokens) / self.rate)
+        return at
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class RateLimiter:
+    """
+    Grants calls in priority order, each one taking a token from the global
+    bucket and from its chat's bucket. A waiter whose chat is not ready does
+    not hold up waiters for other chats.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        global_rate: float,
+        global_burst: float,
+        chat_rate: float,
+        chat_burst: float,
+        max_chats: int = 10_000
+    ):
+        self.name = name
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._chats: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._waiters: List[Tuple[int, int, Optional[Hashable], asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.granted: Dict[str, int] = {priority.name.lower(): 0 for priority in Priority}
+        self.flood_waits = 0
+        self.max_queue_depth = 0
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _ready_at(self, chat_id: Optional[Hashable], now: float) -> float:
+        at = self.global_bucket.ready_at(now)
+        if chat_id is not None:
+            at = max(at, self._chat_bucket(chat_id).ready_at(now))
+        return at
+
+    def _take(self, chat_id: Optional[Hashable], priority: Priority, now: float):
+        self.global_bucket.take(now)
+        if chat_id is not None:
+            self._chat_bucket(chat_id).take(now)
+        self.granted[priority.name.lower()] += 1
+
+    async def acquire(self, chat_id: Optional[Hashable] = None, priority: Priority = Priority.INTERACTIVE):
+        now = time.monotonic()
+        if not self._waiters and self._ready_at(chat_id, now) <= now:
+            self._take(chat_id, priority, now)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((priority, next(self._seq), chat_id, future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    def defer(self, chat_id: Optional[Hashable], seconds: float):
+        """Hold back a chat (or everything, without chat_id) after a flood wait"""
+        until = time.monotonic() + seconds
+        bucket = self.global_bucket if chat_id is None else self._chat_bucket(chat_id)
+        bucket.block(until)
+        self.flood_waits += 1
+        logging.warning(f"{self.name}: flood wait of {seconds}s for chat {chat_id}")
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while self._waiters:
+            self._wakeup.clear()
+            now = time.monotonic()
+            next_at = None
+            for waiter in sorted(self._waiters, key=lambda item: item[:2]):
+                priority, _, chat_id, future = waiter
+                if future.done():  # cancelled by the caller
+                    self._waiters.remove(waiter)
+                    continue
+                at = self._ready_at(chat_id, now)
+                if at <= now:
+                    self._take(chat_id, Priority(priority), now)
+                    self._waiters.remove(waiter)
+                    future.set_result(None)
+                    next_at = now
+                    break
+                next_at = at if next_at is None else min(next_at, at)
+
+            if next_at is not None and next_at > now:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_at - now)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> dict:
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_by_priority": depth,
+            "max_queue_depth": self.max_queue_depth,
+            "granted": dict(self.granted),
+            "flood_waits": self.flood_waits,
+            "deferred_for": round(max(0.0, self.global_bucket.blocked_until - time.monotonic()), 3),
+            "tracked_chats": len(self._chats),
+        }
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """aiogram session middleware routing every Bot API call through a RateLimiter"""
+
+    PAYMENT_METHODS = (
+        methods.SendInvoice,
+        methods.CreateInvoiceLink,
+        methods.AnswerPreCheckoutQuery,
+        methods.AnswerShippingQuery,
+        methods.RefundStarPayment,
+    )
+
+    def __init__(self, limiter: RateLimiter, max_retries: int = 3, max_retry_after: int = 30):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        priority = _priority.get()
+        if priority is None:
+            priority = Priority.PAYMENT if isinstance(method, self.PAYMENT_METHODS) else Priority.INTERACTIVE
+
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.limiter.defer(chat_id, e.retry_after)
+                if attempt == self.max_retries or e.retry_after > self.max_retry_after:
+                    raise
+
+
+bot_api_limiter = RateLimiter(
+    "bot_api",
+    global_rate=settings.TELEGRAM_GLOBAL_RATE,
+    global_burst=settings.TELEGRAM_GLOBAL_BURST,
+    chat_rate=settings.TELEGRAM_CHAT_RATE,
+    chat_burst=settings.TELEGRAM_CHAT_BURST
+)
+mtproto_limiter = RateLimiter(
+    "mtproto",
+    global_rate=settings.MTPROTO_RATE,
+    global_burst=settings.MTPROTO_BURST,
+    chat_rate=settings.MTPROTO_RATE,
+    chat_burst=settings.MTPROTO_BURST
+)
+# Caps broadcasts below the Bot API limit, leaving room for interactive traffic
+broadcast_limiter = RateLimiter(
+    "broadcast",
+    global_rate=settings.BROADCAST_RATE,
+    global_burst=settings.BROADCAST_RATE,
+    chat_rate=1,
+    chat_burst=1
+)
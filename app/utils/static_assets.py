@@ -0,0 +1,169 @@
+"""
+Static asset pipeline: fingerprinted copies of app/static with gzip and
+brotli variants, served with immutable caching and content negotiation.
+
+Runs from the app lifespan, or ahead of time with: python -m app.utils.static_assets
+(the Dockerfile does this at image build). The build dir stays outside
+data/, which is a persistent volume mount hiding anything built into it.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+from typing import Dict, Set
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+SOURCE_DIR = "app/static"
+BUILD_DIR = os.environ.get("STATIC_BUILD_DIR", "build/static")
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt", ".ico"}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# original relative path -> fingerprinted relative path
+manifest: Dict[str, str] = {}
+hashed_paths: Set[str] = set()
+
+
+def _fingerprint(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def _hashed_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def _write_if_missing(path: str, data: bytes):
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def _compress(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    _write_if_missing(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_if_missing(path + ".br", brotli.compress(data, quality=11))
+
+
+def _prune(build_dir: str, keep: Set[str]):
+    """Delete build outputs of earlier source versions: old fingerprints and removed files"""
+    removed = 0
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.relpath(path, build_dir).replace(os.sep, "/") not in keep:
+                os.remove(path)
+                removed += 1
+    if removed:
+        logging.info(f"Removed {removed} stale static build files from {build_dir}")
+
+
+def build_static_assets(source_dir: str = SOURCE_DIR, build_dir: str = BUILD_DIR) -> Dict[str, str]:
+    """Copy, fingerprint and pre-compress every static file; returns the manifest"""
+    result = {}
+    keep = {MANIFEST_NAME}
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            src = os.path.join(root, name)
+            rel_path = os.path.relpath(src, source_dir).replace(os.sep, "/")
+            hashed = _hashed_name(rel_path, _fingerprint(src))
+
+            for target in (rel_path, hashed):
+                dst = os.path.join(build_dir, target)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if target == rel_path:
+                    # Unhashed copy always mirrors the source
+                    shutil.copyfile(src, dst)
+                    for suffix in (".gz", ".br"):
+                        if os.path.exists(dst + suffix):
+                            os.remove(dst + suffix)
+                elif not os.path.exists(dst):
+                    shutil.copyfile(src, dst)
+                keep.add(target)
+                if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                    _compress(dst)
+                    keep.update(target + suffix for suffix in (".gz", ".br"))
+
+            result[rel_path] = hashed
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+    _prune(build_dir, keep)
+
+    manifest.clear()
+    manifest.update(result)
+    hashed_paths.clear()
+    hashed_paths.update(result.values())
+    logging.info(f"Built {len(result)} static assets into {build_dir}")
+    return result
+
+
+def static_url(path: str) -> str:
+    """URL of a static file, fingerprinted when it is in the manifest"""
+    return f"/static/{manifest.get(path, path)}"
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Content codings from an Accept-Encoding header, minus those with q=0"""
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if re.search(r"q\s*=\s*0(\.0*)?\s*$", params):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class AssetStaticFiles(StaticFiles):
+    """
+    StaticFiles serving pre-compressed variants by Accept-Encoding, with
+    immutable caching for fingerprinted files.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        rel_path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        immutable = rel_path in hashed_paths
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        response = None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            compressed_path = full_path + suffix
+            if encoding in accepted and os.path.isfile(compressed_path):
+                media_type, _ = mimetypes.guess_type(full_path)
+                response = FileResponse(
+                    compressed_path,
+                    status_code=status_code,
+                    stat_result=os.stat(compressed_path),
+                    media_type=media_type,
+                    headers={"Content-Encoding": encoding},
+                )
+                break
+        if response is None:
+            response = super().file_response(full_path, stat_result, scope, status_code)
+        elif self.is_not_modified(response.headers, Headers(scope=scope)):
+            # Revalidation against the variant's own ETag / Last-Modified
+            response = NotModifiedResponse(response.headers)
+
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"
+        return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    build_static_assets()
@@ -1,48 +1,95 @@
-from telethon import TelegramClient, functions
+from telethon import TelegramClient, functions, types
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
 import asyncio
 import logging
-import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from app.config import settings
+from app.utils.rate_limiter import Priority, mtproto_limiter
+
 
 class TelegramContactsService:
+    """
+    Process-wide Telethon client, created from a persisted session string.
+
+    The app lifespan connects it once at startup and disconnects it on
+    shutdown; handlers share it through get_instance(). Telethon reconnects
+    dropped connections by itself (auto_reconnect); ensure_connected() covers
+    the case where it gave up.
+    """
     _instance = None
-    _client = None
     _lock = asyncio.Lock()
 
-    def __init__(self):
-        # Create a new client instance with a unique session string
+    def __init__(self, session_string: Optional[str] = None):
         self.client = TelegramClient(
-            StringSession(), 
-            settings.TELEGRAM_API_ID, 
-            settings.TELEGRAM_API_HASH
+            StringSession(session_string),
+            settings.TELEGRAM_API_ID,
+            settings.TELEGRAM_API_HASH,
+            auto_reconnect=True,
+            connection_retries=settings.TELEGRAM_CONNECTION_RETRIES,
+            retry_delay=settings.TELEGRAM_RETRY_DELAY,
+            # Flood waits are handled by call(), so concurrent requests back off together
+            flood_sleep_threshold=0
         )
-        TelegramContactsService._client = self.client
+        self._connect_lock = asyncio.Lock()
 
     @classmethod
-    async def get_instance(cls):
+    async def get_instance(cls) -> "TelegramContactsService":
         if not cls._instance:
             async with cls._lock:
                 if not cls._instance:
-                    cls._instance = cls()
-                    await cls._instance.start()
+                    instance = cls(settings.TELEGRAM_SESSION)
+                    await instance.start()
+                    cls._instance = instance
+        else:
+            await cls._instance.ensure_connected()
         return cls._instance
 
+    @classmethod
+    async def shutdown(cls):
+        """Disconnect the shared client (app shutdown)"""
+        async with cls._lock:
+            if cls._instance:
+                await cls._instance.client.disconnect()
+                cls._instance = None
+
     async def start(self):
-        if not self.client.is_connected():
-            await self.client.connect()
-            if not await self.client.is_user_authorized():
-                phone = settings.TELEGRAM_PHONE
-                await self.client.send_code_request(phone)
-                code = input('Enter the code you received: ')  # For initial run
-                await self.client.sign_in(phone, code)
+        """Connect and check the session; never prompts for a login code"""
+        if not settings.TELEGRAM_SESSION:
+            raise RuntimeError(
+                "TELEGRAM_SESSION is not set, create one with: python -m app.utils.telegram_client"
+            )
+        await self.client.connect()
+        if not await self.client.is_user_authorized():
+            await self.client.disconnect()
+            raise RuntimeError(
+                "TELEGRAM_SESSION is not authorized, create a new one with: python -m app.utils.telegram_client"
+            )
+        logging.info("Telethon client connected")
+
+    async def ensure_connected(self):
+        if self.client.is_connected():
+            return
+        async with self._connect_lock:
+            if not self.client.is_connected():
+                logging.warning("Telethon client disconnected, reconnecting")
+                await self.client.connect()
+
+    async def call(self, request, priority: Priority = Priority.INTERACTIVE):
+        """Send an MTProto request through the rate limiter, waiting out flood waits"""
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            await mtproto_limiter.acquire(priority=priority)
+            try:
+                return await self.client(request)
+            except FloodWaitError as e:
+                mtproto_limiter.defer(None, e.seconds)
+                if attempt == settings.TELEGRAM_MAX_RETRIES or e.seconds > settings.TELEGRAM_MAX_RETRY_AFTER:
+                    raise
 
     async def get_saved_contacts(self):
         try:
-            if not self.client.is_connected():
-                await self.start()
-                
-            result = await self.client(functions.contacts.GetSavedRequest())
+            await self.ensure_connected()
+            result = await self.call(functions.contacts.GetSavedRequest())
             return [
                 {
                     "phone": contact.phone,
@@ -56,14 +103,102 @@ class TelegramContactsService:
             logging.error(f"Error getting saved contacts: {e}")
             raise
 
+    async def import_contacts(
+        self,
+        phone_contacts: List[Dict[str, Any]],
+        chunk_size: int = settings.CONTACT_IMPORT_CHUNK_SIZE,
+        concurrency: int = settings.CONTACT_IMPORT_CONCURRENCY,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Resolve phone contacts to Telegram users with ImportContactsRequest.
+
+        Contacts are sent in chunks of chunk_size, at most concurrency chunks
+        in flight. A failed chunk is logged and its contacts are returned in
+        retry_contacts instead of failing the whole import. on_progress gets
+        the number of contacts processed so far after every chunk.
+        """
+        await self.ensure_connected()
+        input_contacts = [
+            types.InputPhoneContact(
+                client_id=i,
+                phone=str(contact["phone"]),
+                first_name=contact.get("first_name") or "",
+                last_name=contact.get("last_name") or ""
+            )
+            for i, contact in enumerate(phone_contacts)
+            if contact.get("phone")
+        ]
+        chunks = [input_contacts[i:i + chunk_size] for i in range(0, len(input_contacts), chunk_size)]
+        semaphore = asyncio.Semaphore(concurrency)
+        processed = 0
+
+        async def import_chunk(chunk):
+            nonlocal processed
+            async with semaphore:
+                try:
+                    result = await self.call(
+                        functions.contacts.ImportContactsRequest(contacts=chunk), priority=Priority.BULK
+                    )
+                except Exception as e:
+                    logging.error(f"Error importing contacts chunk of {len(chunk)}: {e}")
+                    result = chunk
+            processed += len(chunk)
+            if on_progress:
+                await on_progress(processed)
+            return result
+
+        imported_users = {}
+        resolved = {}
+        retry_contacts = []
+        for result in await asyncio.gather(*(import_chunk(chunk) for chunk in chunks)):
+            if isinstance(result, list):
+                retry_contacts.extend(contact.client_id for contact in result)
+                continue
+            users = {user.id: user for user in result.users}
+            for imported in result.imported:
+                user = users.get(imported.user_id)
+                if user and not user.bot:
+                    resolved[imported.client_id] = user.id
+                    source = phone_contacts[imported.client_id]
+                    imported_users[user.id] = {
+                        "telegram_id": user.id,
+                        "username": user.username,
+                        "first_name": user.first_name or source.get("first_name") or "",
+                        "last_name": user.last_name
+                    }
+            retry_contacts.extend(result.retry_contacts)
+
+        return {
+            "imported_users": list(imported_users.values()),
+            # index in phone_contacts -> Telegram user id
+            "resolved": resolved,
+            "retry_contacts": [phone_contacts[client_id] for client_id in retry_contacts]
+        }
+
     async def __aenter__(self):
-        await self.start()
+        await self.ensure_connected()
         return self
 
     async def __aexit__(self, *args):
+        # The client is shared, it stays connected until app shutdown
         pass
 
 
+async def create_session_string() -> str:
+    """Interactive one-off login that prints a session string for TELEGRAM_SESSION"""
+    client = TelegramClient(StringSession(), settings.TELEGRAM_API_ID, settings.TELEGRAM_API_HASH)
+    await client.start(phone=settings.TELEGRAM_PHONE)
+    try:
+        return client.session.save()
+    finally:
+        await client.disconnect()
+
+
+if __name__ == "__main__":
+    print(asyncio.run(create_session_string()))
+
+
 # import logging
 # from typing import List, Dict, Any
 # import asyncio
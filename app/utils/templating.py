@@ -0,0 +1,42 @@
+import logging
+import os
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from app.config import settings
+from app.utils.bot_identity import bot_identity
+from app.utils.static_assets import static_url
+
+TEMPLATES_DIR = "app/templates"
+
+
+def create_environment() -> Environment:
+    """Shared Jinja2 environment with an on-disk bytecode cache"""
+    os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=True,
+        bytecode_cache=FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR),
+        # Templates only change on deploy in production, skip the mtime checks
+        auto_reload=settings.IS_DEV,
+    )
+    env.globals["bot_identity"] = bot_identity
+    env.globals["static_url"] = static_url
+    return env
+
+
+templates = Jinja2Templates(env=create_environment())
+
+
+def precompile_templates() -> int:
+    """Compile every template into the environment (and bytecode) cache"""
+    env = templates.env
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        try:
+            env.get_template(name)
+        except Exception as e:
+            logging.error(f"Error precompiling template {name}: {e}")
+    logging.info(f"Precompiled {len(names)} templates")
+    return len(names)
@@ -0,0 +1,79 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from app.config import settings
+from app.dao.dao import ProcessedUpdateDAO
+from app.dao.session_maker import async_session_maker
+
+
+class UpdateDeduplicator:
+    """
+    Drops Telegram webhook redeliveries by update_id.
+
+    seen() is a dict lookup over the last `window` update ids, done in the
+    webhook before enqueueing. With use_db, claim() additionally records
+    the id in processed_updates right before the dispatcher runs, so
+    several app processes never handle the same update twice; rows older
+    than `retention` are purged (Telegram keeps updates for 24 hours).
+    """
+
+    def __init__(
+        self,
+        window: int = 10_000,
+        use_db: bool = False,
+        retention: timedelta = timedelta(hours=24),
+        purge_interval: float = 3600
+    ):
+        self.window = window
+        self.use_db = use_db
+        self.retention = retention
+        self.purge_interval = purge_interval
+        # update_id -> None in arrival order; the oldest is evicted first
+        self._ids = OrderedDict()
+        self._last_purge = 0.0
+        self.duplicates = 0
+
+    def seen(self, update_id: int) -> bool:
+        """Check and remember an update id; True if it is a redelivery"""
+        if update_id in self._ids:
+            self.duplicates += 1
+            return True
+        self._ids[update_id] = None
+        if len(self._ids) > self.window:
+            self._ids.popitem(last=False)
+        return False
+
+    def forget(self, update_id: int):
+        """Let a refused update through again when Telegram redelivers it"""
+        self._ids.pop(update_id, None)
+
+    async def claim(self, update_id: int) -> bool:
+        """Cross-process claim before processing; always True without use_db"""
+        if not self.use_db:
+            return True
+        try:
+            async with async_session_maker() as session:
+                dao = ProcessedUpdateDAO(session)
+                if time.monotonic() - self._last_purge > self.purge_interval:
+                    self._last_purge = time.monotonic()
+                    await dao.purge(self.retention)
+                claimed = await dao.claim(update_id)
+        except Exception as e:
+            # Better to risk a duplicate than to drop the update
+            logging.error(f"Update dedup store unavailable, processing {update_id}: {e}")
+            return True
+        if not claimed:
+            self.duplicates += 1
+        return claimed
+
+    def snapshot(self) -> dict:
+        return {"window": len(self._ids), "duplicates": self.duplicates, "use_db": self.use_db}
+
+
+update_dedup = UpdateDeduplicator(
+    window=settings.UPDATE_DEDUP_WINDOW,
+    use_db=settings.UPDATE_DEDUP_DB,
+    retention=timedelta(hours=settings.UPDATE_DEDUP_RETENTION_HOURS)
+)
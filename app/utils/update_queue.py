@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.types.update import UpdateTypeLookupError
+
+from app.bot.create_bot import bot, dp
+from app.config import settings
+from app.utils.update_dedup import UpdateDeduplicator, update_dedup
+
+
+def shard_key(update: Update) -> int:
+    """
+    Ordering key of an update: its chat id, else its user id.
+
+    In private chats both are the user id, so a user's messages, callback
+    queries and pre-checkout queries share a key.
+    """
+    try:
+        event = update.event
+    except UpdateTypeLookupError:  # unknown update type, no ordering needed
+        return update.update_id
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None) or getattr(event, "user", None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Bounded in-process queue between the webhook and the dispatcher.
+
+    The webhook only validates and enqueues, so Telegram gets its 200 right
+    away. Updates are sharded by chat (or user) over one queue per worker:
+    a chat's updates are handled one at a time and in order (/start before
+    a payment, pre_checkout_query before successful_payment), different
+    chats in parallel. When a shard is full, put() waits up to
+    enqueue_timeout and then refuses the update, and the webhook answers
+    503 so Telegram redelivers it later.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        dp: Dispatcher,
+        workers: int = 8,
+        maxsize: int = 1000,
+        enqueue_timeout: float = 1.0,
+        drain_timeout: float = 10.0,
+        dedup: Optional[UpdateDeduplicator] = None
+    ):
+        self.bot = bot
+        self.dp = dp
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+        self.drain_timeout = drain_timeout
+        self.dedup = dedup
+        shard_size = max(1, -(-maxsize // workers))
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=shard_size) for _ in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+        self._accepting = False
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    async def put(self, update: Update) -> bool:
+        """Enqueue an update; False if it was refused (shutting down or full)"""
+        if not self._accepting:
+            self.rejected += 1
+            return False
+        if self.dedup and self.dedup.seen(update.update_id):
+            # Redelivery of an update already accepted, acknowledge and drop it
+            return True
+        queue = self._queues[shard_key(update) % len(self._queues)]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(queue.put(update), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                if self.dedup:
+                    self.dedup.forget(update.update_id)
+                logging.warning(f"Update queue full, refusing update {update.update_id}")
+                return False
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, queue.qsize())
+        return True
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        self._accepting = True
+
+    async def stop(self):
+        """Stop accepting updates, let the workers drain the queue, then stop them"""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), self.drain_timeout
+            )
+        except asyncio.TimeoutError:
+            logging.warning(f"Update queue not drained in {self.drain_timeout}s, {self.depth()} updates dropped")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                if self.dedup and not await self.dedup.claim(update.update_id):
+                    continue
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Error processing update {update.update_id}: {e}")
+            finally:
+                queue.task_done()
+
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def snapshot(self) -> dict:
+        return {
+            "depth": self.depth(),
+            "busiest_shard": max(queue.qsize() for queue in self._queues),
+            "max_shard_depth": self.max_depth,
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "dedup": self.dedup.snapshot() if self.dedup else None,
+        }
+
+
+update_queue = UpdateQueue(
+    bot,
+    dp,
+    workers=settings.WEBHOOK_WORKERS,
+    maxsize=settings.WEBHOOK_QUEUE_SIZE,
+    enqueue_timeout=settings.WEBHOOK_ENQUEUE_TIMEOUT,
+    drain_timeout=settings.WEBHOOK_DRAIN_TIMEOUT,
+    dedup=update_dedup
+)